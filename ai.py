@@ -1,16 +1,193 @@
+import multiprocessing
 import random
+import threading
+import time
 from Chess.constants import *
+from Chess.chess_engine import ChessEngine
+from Chess.opening_book import open_book, BOOK_PATH
+from Chess.batch_eval import evaluate_children, require_numpy
+from Chess.endgame_tables import open_tables, TABLE_DIRECTORY, WIN as TABLE_WIN, LOSS as TABLE_LOSS
+from Chess.search_stats import SearchStats
+from Chess.transposition import TranspositionTable, EXACT, LOWER_BOUND, UPPER_BOUND, DEPTH as TT_DEPTH, SCORE, FLAG, \
+    BEST_MOVE
 
 # some sources
 # https://www.freecodecamp.org/news/simple-chess-ai-step-by-step-1d55a9266977/
 # https://www.chessprogramming.org/Simplified_Evaluation_Function
 # https://en.wikipedia.org/wiki/Negamax
+# https://www.chessprogramming.org/Iterative_Deepening
+# https://www.chessprogramming.org/Move_Ordering
+# https://www.chessprogramming.org/Quiescence_Search
+# https://www.chessprogramming.org/Parallel_Search
+# https://www.chessprogramming.org/Null_Move_Pruning
+# https://www.chessprogramming.org/Late_Move_Reductions
+# https://www.chessprogramming.org/Futility_Pruning
+# https://www.chessprogramming.org/Pondering
+
+# deepest iteration a search with a time or node budget will start
+MAX_SEARCH_DEPTH = 32
+
+# how many nodes (quiescence nodes included) are searched between looks at the clock, the node limit and the cancel
+# event. 64 nodes is under 20ms of search, so a cancelled ponder or an expired clock stops almost at once
+TIME_CHECK_INTERVAL = 64
+
+# seconds the parallel search waits for a worker's result before looking whether it was cancelled
+CANCEL_POLL_INTERVAL = 0.05
+
+# move ordering scores, moves are searched from the highest score down. Hash move first, then captures (and
+# promotions) by MVV-LVA, then the killer moves of the ply, then quiet moves by their history score
+HASH_MOVE_SCORE = 1000000
+CAPTURE_SCORE = 100000
+KILLER_SCORES = (90000, 80000)
+MAX_HISTORY_SCORE = 79999
+
+# quiescence search skips a capture when even winning the captured piece plus this margin can't raise alpha
+DELTA_MARGIN = 2 * PIECE_STRENGTH['P']
+
+# selective search. The null move search is this many plies shallower than a real move's, and only tried with at least
+# NULL_MOVE_MIN_DEPTH plies left
+NULL_MOVE_REDUCTION = 2
+NULL_MOVE_MIN_DEPTH = 3
+
+# late move reductions: with at least LMR_MIN_DEPTH plies left, quiet moves after the first LMR_FULL_DEPTH_MOVES are
+# searched a ply shallower, and again to the full depth only if they turn out better than alpha
+LMR_MIN_DEPTH = 3
+LMR_FULL_DEPTH_MOVES = 3
+
+# futility pruning: with 1 or 2 plies left, quiet moves are skipped when the board score plus this margin can't reach
+# alpha
+FUTILITY_MARGINS = (2 * PIECE_STRENGTH['P'], 5 * PIECE_STRENGTH['P'])
+
+# width of the windows that only ask whether a score is above a bound (null move and reduced searches)
+NULL_WINDOW = PIECE_STRENGTH['P'] / 100
+
+# score of a position the endgame tables say is won, less the plies to checkmate so the search goes for the fastest
+# mate. Below CHECKMATE so it isn't taken for a mate found by the search.
+TABLE_WIN_SCORE = CHECKMATE // 2
+
+
+class SearchTimeout(Exception):
+    """
+    Raised inside the search when the time or node budget runs out, to unwind back to negamax_alphabeta_ai
+    """
+
+
+# the ChessAI of a worker process of the parallel search, kept between searches so its transposition table is reused
+worker_ai = None
+
+
+def init_worker(selective_options):
+    """
+    Sets up a worker process of the parallel search, with the same selective search options as the main process
+    """
+    global worker_ai
+    worker_ai = ChessAI(book_path=None, **selective_options)
+
+
+def search_root_move(task):
+    """
+    Runs in a worker process of the parallel search. The task is (fen, move_id, depth, alpha, deadline, collect_stats):
+    the root position as a FEN string and the move_id of the root move to search, so only a short string and a few
+    numbers are sent between processes. The deadline is a time.time() timestamp or None, since tasks can wait in the
+    queue before a worker gets to them. Returns (move_id, score, nodes, qnodes, counters), the score is None if the
+    time ran out and counters are the SearchStats tree_counters of the search with collect_stats, else None.
+    """
+    fen, move_id, depth, alpha, deadline, collect_stats = task
+    engine = ChessEngine()
+    engine.load_fen(fen)
+    time_limit = deadline - time.time() if deadline is not None else None
+
+    # the worker's transposition table isn't reset between tasks, so its probes are counted from here
+    worker_ai.stats = SearchStats() if collect_stats else None
+    tt_probes = worker_ai.transposition_table.probes
+    tt_hits = worker_ai.transposition_table.hits
+
+    result = worker_ai.search_root_move(engine, move_id, depth, alpha, time_limit)
+
+    counters = None
+    if collect_stats:
+        stats = worker_ai.stats
+        stats.tt_probes = worker_ai.transposition_table.probes - tt_probes
+        stats.tt_hits = worker_ai.transposition_table.hits - tt_hits
+        stats.move_cache_lookups = engine.move_cache_lookups
+        stats.move_cache_hits = engine.move_cache_lookups - engine.move_cache_misses
+        counters = stats.tree_counters()
+    return result + (counters,)
 
 
 class ChessAI:
 
-    def __init__(self):
+    def __init__(self, time_limit=None, node_limit=None, workers=1, book_path=BOOK_PATH,
+                 table_directory=TABLE_DIRECTORY, collect_stats=False, stats_log=None, batch_eval=False, depth=DEPTH,
+                 null_move=True, late_move_reductions=True, futility_pruning=True):
+        """
+        time_limit (seconds) and node_limit are the budget negamax_alphabeta_ai gets per move. Without either it
+        searches to depth. With more than one worker negamax_alphabeta_ai splits the root moves between that many
+        processes (the node limit only applies to a single process search). negamax_alphabeta_ai plays from the
+        opening book at book_path while the game is in it, and plays the endings in the endgame tables in
+        table_directory perfectly. None turns either off.
+        With collect_stats every negamax_alphabeta_ai search fills a SearchStats, kept in self.stats, and with a
+        stats_log (an open text file) each one is also written to it as a line of JSON.
+        batch_eval scores all the children of each frontier node (one ply above the quiescence search) in one numpy
+        call and searches the quiet moves best score first, instead of by their history scores. It needs numpy.
+        null_move, late_move_reductions and futility_pruning turn the selective search on or off, each on its own so
+        they can be compared (search_benchmark does).
+        """
         self.garbage = False
+        self.time_limit = time_limit
+        self.node_limit = node_limit
+        self.workers = workers
+
+        self.depth = depth
+
+        if batch_eval:
+            require_numpy()
+        self.batch_eval = batch_eval
+
+        # selective search, see negamax_alphabeta_helper
+        self.null_move = null_move
+        self.late_move_reductions = late_move_reductions
+        self.futility_pruning = futility_pruning
+
+        # the process pool of the parallel search, started the first time it is needed
+        self.pool = None
+
+        # None if there is no book file or there are no tables
+        self.opening_book = open_book(book_path)
+        self.endgame_tables = open_tables(table_directory)
+
+        # statistics of the last search, None unless they are being collected
+        self.collect_stats = collect_stats or stats_log is not None
+        self.stats_log = stats_log
+        self.stats = None
+
+        # a threading.Event that stops the search when set, for running the AI on its own thread
+        self.cancel_event = None
+
+        # ponder_hit comes from another thread, the lock keeps it from landing in the middle of a ponder search setting
+        # up its budget. ponder_hit_received keeps a hit that came before the search got that far, whoever starts a
+        # ponder search sets it back to False first.
+        self.ponder_lock = threading.Lock()
+        self.ponder_hit_received = False
+        self.pondering = False
+
+        # search results kept between moves of the game
+        self.transposition_table = TranspositionTable()
+
+        # state of the search in progress
+        self.root_depth = depth
+        self.root_best_move = None
+        self.search_start = None
+        self.deadline = None
+        self.max_nodes = None
+        self.max_depth = depth
+        self.nodes = 0  # positions searched to a depth
+        self.qnodes = 0  # positions searched by the quiescence search past the depth
+
+        # move ordering: two killer moves (quiet moves that caused a beta cutoff) per ply from the root, and history
+        # scores by move_id for quiet moves that caused cutoffs anywhere in the tree
+        self.killer_moves = [[None, None] for _ply in range(MAX_SEARCH_DEPTH + 1)]
+        self.history = {}
 
     def random_ai(self, moves):
         """
@@ -23,35 +200,31 @@ class ChessAI:
         """
         This AI will determine if a piece to capture should be made based on the value of the piece. It doesn't use in
         depth branching to valid if the move was the best choice, just determines the best possible move of the current
-        state.
+        state. Captures are scored with a static exchange evaluation, so it sees when its piece would be taken back,
+        without making any of the moves.
         """
 
-        # set checkmate at best_score which is 1000 worst for black, black will score is best when negative
-        best_score = CHECKMATE
+        best_score = None
         best_move = None
 
-        # shuffle list so same move doesnt repeat if no captures
+        # shuffle list so same move doesnt repeat if no captures (a copy, the engine caches the list it returned)
+        moves = list(moves)
         random.shuffle(moves)
 
         # loop through list to determine the best move that can make
         for move in moves:
 
-            # make the move and score the board based on the move
-            engine.make_move(move)
-            score = engine.get_material_score()
+            # material won or lost on the end square once the captures there are played out
+            score = engine.static_exchange(move)
 
-            if engine.is_in_check("WHITE", castling_row=engine.get_king_location()[0][0], 
-                                  castling_col=engine.get_king_location()[0][1], castling=True):
-                score = -CHECK
+            # go for a check, as long as it doesn't give away material
+            if score >= 0 and engine.gives_check(move):
+                score += CHECK
 
-            # if neither checkmate, stalemate, check then make if score will get better for black
-            if score < best_score:
+            if best_score is None or score > best_score:
                 best_score = score
                 best_move = move
 
-            # undo the move
-            engine.undo_move()
-            
         # choose random if move is none
         if best_move is None:
             best_move = self.random_ai(moves)
@@ -59,59 +232,635 @@ class ChessAI:
         return best_move
 
     # ------------------------
-    def negamax_alphabeta_ai(self, moves, engine):
+    def score_move(self, move, hash_move_id, killers, engine):
+        """
+        Returns how early a move should be searched. Captures are scored Most Valuable Victim - Least Valuable
+        Attacker, so taking a queen with a pawn comes before taking a pawn with a queen. A capture by a piece worth
+        more than the one it takes gets a static exchange evaluation, and if it loses material it goes after the quiet
+        moves instead.
+        """
+        if move.move_id == hash_move_id:
+            return HASH_MOVE_SCORE
+
+        if move.piece_captured is not None:
+            if PIECE_STRENGTH[move.piece_captured[1]] < PIECE_STRENGTH[move.piece_moved[1]]:
+                exchange = engine.static_exchange(move)
+                if exchange < 0:
+                    return exchange
+            score = CAPTURE_SCORE + 10 * PIECE_STRENGTH[move.piece_captured[1]] - PIECE_STRENGTH[move.piece_moved[1]]
+            if move.pawn_promotion:
+                score += 10 * PIECE_STRENGTH['Q']
+            return score
+        if move.pawn_promotion:
+            return CAPTURE_SCORE + 10 * PIECE_STRENGTH['Q']
+
+        if move == killers[0]:
+            return KILLER_SCORES[0]
+        if move == killers[1]:
+            return KILLER_SCORES[1]
+
+        return min(self.history.get(move.move_id, 0), MAX_HISTORY_SCORE)
+
+    def order_moves(self, moves, engine, hash_move_id, ply):
+        """
+        Returns the moves sorted best first for the search. The sort is stable, so moves with the same score keep the
+        shuffled order they came in.
+        """
+        killers = self.killer_moves[ply]
+        return sorted(moves, key=lambda move: self.score_move(move, hash_move_id, killers, engine),
+                      reverse=True)
+
+    def order_frontier_moves(self, moves, engine, hash_move_id, ply, turn_base):
+        """
+        order_moves for a node whose children are all scored by the quiescence search. The children are scored at once
+        by batch_eval and the quiet moves, which have nothing better to go on than their history, are searched best
+        score for the side to move first. The hash move, captures and killers keep their place ahead of them.
+        """
+        killers = self.killer_moves[ply]
+        child_scores = evaluate_children(engine, moves)
+        keys = []
+        for move, child_score in zip(moves, child_scores):
+            move_score = self.score_move(move, hash_move_id, killers, engine)
+            if 0 <= move_score <= MAX_HISTORY_SCORE:
+                move_score = 0
+            keys.append((move_score, turn_base * child_score))
+
+        ranking = sorted(range(len(moves)), key=keys.__getitem__, reverse=True)
+        return [moves[index] for index in ranking]
+
+    def record_cutoff(self, move, depth, ply):
+        """
+        Remembers a quiet move that caused a beta cutoff as a killer move of the ply and raises its history score.
+        Captures are already ordered first by MVV-LVA.
+        """
+        if move.piece_captured is not None or move.pawn_promotion:
+            return
+
+        killers = self.killer_moves[ply]
+        if killers[0] != move:
+            killers[1] = killers[0]
+            killers[0] = move
+
+        # deeper cutoffs save more work, so they count for more
+        self.history[move.move_id] = self.history.get(move.move_id, 0) + depth * depth
+
+    def negamax_alphabeta_ai(self, moves, engine, time_limit=None, node_limit=None, return_stats=False, ponder=False):
+        """
+        Returns the AI's move, found by search_move. With return_stats it returns (move, SearchStats of the search)
+        instead, the statistics are also collected when the AI was created with collect_stats.
+        With ponder the search has no budget and keeps going deeper until it is cancelled or ponder_hit gives it one,
+        for searching the position after the opponent's expected move while they are still thinking.
+        """
+        stats = SearchStats() if return_stats or self.collect_stats else None
+        self.stats = stats
+        self.nodes = 0
+        self.qnodes = 0
+        cache_lookups = engine.move_cache_lookups
+        cache_misses = engine.move_cache_misses
+
+        best_move = self.search_move(moves, engine, time_limit, node_limit, ponder)
+
+        if stats is not None:
+            stats.nodes = self.nodes
+            stats.qnodes = self.qnodes
+            # added to, a parallel search has already added the workers' counts
+            cache_lookups = engine.move_cache_lookups - cache_lookups
+            stats.move_cache_lookups += cache_lookups
+            stats.move_cache_hits += cache_lookups - (engine.move_cache_misses - cache_misses)
+            if stats.source == 'search':
+                stats.tt_probes += self.transposition_table.probes
+                stats.tt_hits += self.transposition_table.hits
+            stats.finish(best_move)
+            if self.stats_log is not None:
+                self.stats_log.write(stats.to_json() + '\n')
+                self.stats_log.flush()
+
+        if return_stats:
+            return best_move, stats
+        return best_move
+
+    def search_move(self, moves, engine, time_limit=None, node_limit=None, ponder=False):
         """
         This method uses the negamax algorithm and calls a helper function recursively. Negamax_ai takes the list of
         valid moves and the engine and calls the helper with moves, the engine, the depth for the amount of recursive
         calls, and turn_base multiplier 1 for white and -1 for black. The white player wants to get the most positive
         score while the black player tries to get the most negative score.
+        The search is iterative deepening: depth 1, 2, 3... until the time or node budget (the arguments, or the ones
+        given to the constructor) runs out, returning the best move of the last depth that finished. Each depth
+        searches the previous best move first. Without a budget it stops after self.depth, when pondering it doesn't
+        stop by itself. Pondering always searches in this process.
         """
 
-        # create a global variable to be used between this and helper function and set to none
-        global next_move
-        next_move = None
+        # no need to search while the position is in the opening book
+        if self.opening_book is not None:
+            book_move = self.opening_book.choose_move(engine, moves)
+            if book_move is not None:
+                if self.stats is not None:
+                    self.stats.source = 'book'
+                return book_move
+
+        # or in the endgame tables
+        if self.endgame_tables is not None and self.endgame_tables.probe(engine) is not None:
+            table_move = self.endgame_tables.best_move(engine, moves)
+            if table_move is not None:
+                if self.stats is not None:
+                    self.stats.source = 'tables'
+                return table_move
 
-        # shuffle the moves before making the negamax decision
+        if self.workers > 1 and not ponder:
+            return self.parallel_negamax_ai(moves, engine, time_limit)
+
+        # shuffle the moves before making the negamax decision (a copy, the engine caches the list it returned)
+        moves = list(moves)
         random.shuffle(moves)
 
-        # call negamax
-        self.negamax_alphabeta_helper(moves, engine, DEPTH, -CHECKMATE, CHECKMATE, -1)
+        # set up the budget, pondering gets one from ponder_hit
+        time_limit = self.time_limit if time_limit is None else time_limit
+        node_limit = self.node_limit if node_limit is None else node_limit
+        with self.ponder_lock:
+            self.search_start = time.perf_counter()
+            self.deadline = self.search_start + time_limit if time_limit and not ponder else None
+            self.max_nodes = node_limit if not ponder else None
+            self.nodes = 0
+            self.qnodes = 0
+            self.max_depth = MAX_SEARCH_DEPTH if time_limit or node_limit or ponder else self.depth
+            self.root_depth = 0
 
-        # if move is still none call random
-        if next_move is None:
-            next_move = self.random_ai(moves)
+            # the opponent may already have played the expected move
+            self.pondering = ponder
+            if ponder and self.ponder_hit_received:
+                self.set_ponder_budget()
 
-        return next_move
+        # entries of the previous searches stay in the table but get replaced first
+        self.transposition_table.new_search()
 
-    def negamax_alphabeta_helper(self, moves, engine, depth, alpha, beta, turn_base):
+        # killers are about positions at a ply of this search, history only fades so older cutoffs count for less
+        self.killer_moves = [[None, None] for _ply in range(MAX_SEARCH_DEPTH + 1)]
+        for move_id in self.history:
+            self.history[move_id] //= 2
+
+        turn_base = 1 if engine.white_turn else -1
+        root_stack_size = len(engine.move_stack)
+        best_move = None
+
+        for depth in range(1, MAX_SEARCH_DEPTH + 1):
+            # ponder_hit can lower max_depth while the search is running
+            if depth > self.max_depth:
+                break
+            self.root_depth = depth
+            self.root_best_move = None
+            try:
+                score = self.negamax_alphabeta_helper(moves, engine, depth, -CHECKMATE, CHECKMATE, turn_base)
+            except SearchTimeout:
+                # take back the moves of the unfinished iteration and keep the last finished one
+                while len(engine.move_stack) > root_stack_size:
+                    engine.pop()
+
+                # out of time in the first iteration, the best of the root moves it did finish beats guessing
+                if best_move is None:
+                    best_move = self.root_best_move
+                break
+
+            if self.root_best_move is not None:
+                best_move = self.root_best_move
+
+                # search the principal variation first next iteration, the transposition table has its replies
+                moves.remove(best_move)
+                moves.insert(0, best_move)
+
+            if self.stats is not None:
+                self.stats.finish_iteration(depth, self.nodes + self.qnodes)
+                self.stats.depth = depth
+                self.stats.score = score * turn_base
+
+            # no point searching deeper once a forced mate is found
+            if abs(score) >= CHECKMATE:
+                break
+
+        with self.ponder_lock:
+            self.pondering = False
+
+        # not even one root move was searched, play the one the move ordering likes best (winning captures first)
+        if best_move is None:
+            entry = self.transposition_table.probe(engine.position_key())
+            best_move = self.order_moves(moves, engine, entry[BEST_MOVE] if entry is not None else None, 0)[0]
+
+        return best_move
+
+    def parallel_negamax_ai(self, moves, engine, time_limit=None):
+        """
+        negamax_alphabeta_ai split across self.workers processes at the root. For each depth of the iterative
+        deepening the best move so far is searched here first, then the rest of the root moves are searched by the
+        workers with its score as alpha, so they only have to prove a move is worse instead of finding out by how much.
+        Only the FEN of the position is sent to the workers, which is all they need since the search doesn't look at the
+        game history. When statistics are collected the workers send back their counters too and they are added to
+        self.stats.
+        Experimental: it has only been measured on one core, where it is about half as fast as a single process (the
+        workers share the CPU and each has its own transposition table). parallel_benchmark measures it.
+        """
+        moves = list(moves)
+        random.shuffle(moves)
 
-        # let the negamax function know that the global variable is being used
-        global next_move
+        # time.time() rather than perf_counter since the deadline is shared with the worker processes
+        time_limit = self.time_limit if time_limit is None else time_limit
+        deadline = time.time() + time_limit if time_limit else None
+        max_depth = MAX_SEARCH_DEPTH if time_limit else self.depth
 
-        # base case which is to return the piece values by the turn_base multiplier
+        if self.pool is None:
+            # spawned rather than forked, the search runs on a thread of the pygame process and forking a threaded
+            # process can copy locks held by the other threads
+            self.pool = multiprocessing.get_context('spawn').Pool(self.workers, initializer=init_worker,
+                                                                  initargs=(self.selective_options(),))
+
+        self.transposition_table.new_search()
+        fen = engine.get_fen()
+        best_move = None
+        nodes = 0
+        qnodes = 0
+
+        for depth in range(1, max_depth + 1):
+            remaining = deadline - time.time() if deadline else None
+            if remaining is not None and remaining <= 0:
+                break
+
+            # the first move sets the bound for the others
+            result = self.search_root_move(engine, moves[0].move_id, depth, -CHECKMATE, remaining)
+            alpha = result[1]
+            nodes += result[2]
+            qnodes += result[3]
+            if alpha is None:
+                break
+            depth_best_move = moves[0]
+
+            # the workers search the rest
+            tasks = [(fen, move.move_id, depth, alpha, deadline, self.stats is not None) for move in moves[1:]]
+            finished = True
+            results = self.pool.imap_unordered(search_root_move, tasks)
+            for _task in tasks:
+                # wait for each result a little at a time so a cancel is seen while the workers are still searching
+                result = None
+                while result is None and not (self.cancel_event is not None and self.cancel_event.is_set()):
+                    try:
+                        result = results.next(timeout=CANCEL_POLL_INTERVAL)
+                    except multiprocessing.TimeoutError:
+                        pass
+                if result is None:
+                    # the tasks still queued or running would hold the workers until the deadline (forever without
+                    # one), so the pool goes and the next search starts a new one
+                    self.close()
+                    finished = False
+                    break
+                move_id, score, move_nodes, move_qnodes, counters = result
+                nodes += move_nodes
+                qnodes += move_qnodes
+                if counters is not None:
+                    self.stats.add_counters(counters)
+                if score is None:
+                    finished = False
+                elif score > alpha:
+                    alpha = score
+                    depth_best_move = next(move for move in moves if move.move_id == move_id)
+            if not finished:
+                break
+
+            # the best move is searched first, and sets the bound, next depth
+            best_move = depth_best_move
+            moves.remove(best_move)
+            moves.insert(0, best_move)
+
+            if self.stats is not None:
+                self.stats.finish_iteration(depth, nodes + qnodes)
+                self.stats.depth = depth
+                self.stats.score = alpha if engine.white_turn else -alpha
+            if abs(alpha) >= CHECKMATE:
+                break
+
+        # node counts of all the processes together
+        self.nodes = nodes
+        self.qnodes = qnodes
+
+        if best_move is None:
+            best_move = moves[0]
+
+        return best_move
+
+    def search_root_move(self, engine, move_id, depth, alpha, time_limit=None):
+        """
+        Searches a single root move of the engine's position to the depth, with alpha as the score to beat. Returns
+        (move_id, score, nodes, qnodes) where the score is from the point of view of the side making the move (at most
+        alpha if the move isn't better), or None if the time ran out.
+        """
+        self.deadline = time.perf_counter() + time_limit if time_limit is not None else None
+        self.max_nodes = None
+        self.root_depth = depth
+        self.nodes = 0
+        self.qnodes = 0
+
+        # a task that waited in the queue past the deadline
+        if time_limit is not None and time_limit <= 0:
+            return move_id, None, 0, 0
+        turn_base = 1 if engine.white_turn else -1
+        root_stack_size = len(engine.move_stack)
+
+        move = next(move for move in engine.valid_moves() if move.move_id == move_id)
+        engine.push(move)
+        try:
+            score = -self.negamax_alphabeta_helper(engine.valid_moves(), engine, depth - 1, -CHECKMATE, -alpha,
+                                                   -turn_base)
+        except SearchTimeout:
+            score = None
+        while len(engine.move_stack) > root_stack_size:
+            engine.pop()
+
+        return move_id, score, self.nodes, self.qnodes
+
+    def ponder_hit(self):
+        """
+        Called from another thread when the opponent played the move a ponder search is searching after. The search
+        gets the AI's usual budget, counted from when pondering started, so after a long think it stops right away
+        with what it already found. If the search hasn't set up its budget yet it takes the hit when it does.
+        """
+        with self.ponder_lock:
+            self.ponder_hit_received = True
+            if self.pondering:
+                self.set_ponder_budget()
+
+    def set_ponder_budget(self):
+        """
+        Gives the ponder search the AI's usual budget, with ponder_lock held
+        """
+        if self.time_limit:
+            self.deadline = self.search_start + self.time_limit
+        elif self.node_limit:
+            self.max_nodes = self.node_limit
+        else:
+            self.max_depth = self.depth
+            if self.root_depth > self.depth:
+                self.deadline = time.perf_counter()
+
+    def expected_reply(self, engine, move):
+        """
+        Returns the opponent's move the last search expects after the AI plays move (the next move of the principal
+        variation, from the transposition table), or None if there isn't one. This is the move to ponder on.
+        """
+        engine.push(move)
+        entry = self.transposition_table.probe(engine.position_key())
+        reply = None
+        if entry is not None and entry[BEST_MOVE] is not None:
+            reply = next((reply_move for reply_move in engine.valid_moves() if reply_move.move_id == entry[BEST_MOVE]),
+                         None)
+        engine.pop()
+        return reply
+
+    def selective_options(self):
+        """
+        Returns the selective search options as constructor keyword arguments
+        """
+        return {'null_move': self.null_move, 'late_move_reductions': self.late_move_reductions,
+                'futility_pruning': self.futility_pruning}
+
+    def close(self):
+        """
+        Stops the worker processes of the parallel search, if they were started
+        """
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+
+    def has_pieces(self, engine):
+        """
+        Returns whether the side to move has a piece other than its king and pawns
+        """
+        own_pieces = engine.piece_locations[WHITE if engine.white_turn else BLACK]
+        return any(piece[1] in 'NBRQ' for piece in own_pieces.values())
+
+    def check_budget(self):
+        """
+        Raises SearchTimeout when the time or node budget has run out or the search was cancelled, looking only every
+        so often
+        """
+        searched = self.nodes + self.qnodes
+        if searched % TIME_CHECK_INTERVAL == 0:
+            if (self.deadline is not None and time.perf_counter() >= self.deadline) or \
+                    (self.max_nodes is not None and searched >= self.max_nodes) or \
+                    (self.cancel_event is not None and self.cancel_event.is_set()):
+                raise SearchTimeout()
+
+    def negamax_alphabeta_helper(self, moves, engine, depth, alpha, beta, turn_base):
+
+        # base case, instead of scoring the board in the middle of a capture sequence play the captures out first
         if depth == 0:
-            return turn_base * engine.get_material_score(hard_mode=True)
+            if self.stats is not None:
+                self.stats.leaves += 1
+            return self.quiescence(moves, engine, alpha, beta, turn_base)
+
+        self.nodes += 1
+        self.check_budget()
+
+        # with few enough pieces left the endgame tables know the exact result
+        if self.endgame_tables is not None and len(engine.piece_locations[WHITE]) + \
+                len(engine.piece_locations[BLACK]) <= self.endgame_tables.max_pieces:
+            table_result = self.endgame_tables.probe(engine)
+            if table_result is not None:
+                if self.stats is not None:
+                    self.stats.table_hits += 1
+                result, plies = table_result
+                if result == TABLE_WIN:
+                    return TABLE_WIN_SCORE - plies
+                if result == TABLE_LOSS:
+                    return plies - TABLE_WIN_SCORE
+                return STALEMATE
+
+        # look the position up in the transposition table. A result from a search at least as deep can be used
+        # directly or narrows the window, except at the root which has to search to pick root_best_move
+        original_alpha = alpha
+        key = engine.position_key()
+        entry = self.transposition_table.probe(key)
+        hash_move_id = None
+        if entry is not None:
+            if depth != self.root_depth and entry[TT_DEPTH] >= depth:
+                if entry[FLAG] == EXACT:
+                    return entry[SCORE]
+                elif entry[FLAG] == LOWER_BOUND:
+                    alpha = max(alpha, entry[SCORE])
+                else:
+                    beta = min(beta, entry[SCORE])
+                if alpha >= beta:
+                    return entry[SCORE]
+
+            # the best move found for the position last time is the most likely to cause a cutoff, so try it first
+            hash_move_id = entry[BEST_MOVE]
+
+        # the selective search needs to know whether the side to move is in check and the board score, but never
+        # prunes or reduces at the root
+        selective = depth != self.root_depth and (self.null_move or self.late_move_reductions or self.futility_pruning)
+        in_check = False
+        if selective:
+            king_row, king_col = engine.get_king_location()[0 if engine.white_turn else 1]
+            in_check = engine.is_square_attacked(king_row, king_col, BLACK if engine.white_turn else WHITE)
+            static_score = turn_base * engine.get_material_score(hard_mode=True)
+
+        # null move pruning, let the other side move twice in a row. If a shallower search still fails high the
+        # position is good enough that a real move would too. Passing isn't allowed in check, two passes in a row
+        # prove nothing, and with only pawns left passing can be better than any move (zugzwang) so it isn't tried
+        if self.null_move and selective and not in_check and moves and depth >= NULL_MOVE_MIN_DEPTH and \
+                static_score >= beta and abs(beta) < TABLE_WIN_SCORE and \
+                (not engine.move_stack or engine.move_stack[-1] is not None) and self.has_pieces(engine):
+            engine.push_null()
+            score = -self.negamax_alphabeta_helper(engine.valid_moves(), engine, depth - 1 - NULL_MOVE_REDUCTION,
+                                                   -beta, -beta + NULL_WINDOW, -turn_base)
+            engine.pop()
+            if score >= beta:
+                if self.stats is not None:
+                    self.stats.null_move_cutoffs += 1
+                return beta
+
+        # futility pruning, close to the leaves a quiet move can't make up for a board score far below alpha
+        futility_score = None
+        if self.futility_pruning and selective and not in_check and depth <= len(FUTILITY_MARGINS) and \
+                abs(alpha) < TABLE_WIN_SCORE and static_score + FUTILITY_MARGINS[depth - 1] <= alpha:
+            futility_score = static_score + FUTILITY_MARGINS[depth - 1]
+
+        # search the moves most likely to cause a cutoff first
+        ply = self.root_depth - depth
+        if depth == 1 and self.batch_eval:
+            moves = self.order_frontier_moves(moves, engine, hash_move_id, ply, turn_base)
+        else:
+            moves = self.order_moves(moves, engine, hash_move_id, ply)
 
         # set max_score to -CHECKMATE, since using this we will be using a multiplier that will change the score to
         # all positives regardless of black or white turn
         max_score = -CHECKMATE
+        best_move = None
 
         # Iterate through the move list and make the move. Get the next set of valid moves for the other player and
         # call recursively to get the score of the opponent and score the move. This will end once the depth is reached
-        # in all branches and the final score is returned tied to the global next_move. When alpha and beta meet, there
+        # in all branches and the final score is returned tied to root_best_move. When alpha and beta meet, there
         # is no need to continue down that branch because we already found it
-        for move in moves:
-            engine.make_move(move)
+        killers = self.killer_moves[ply]
+        for index, move in enumerate(moves):
+            quiet = move.piece_captured is None and not move.pawn_promotion
+
+            # skip quiet moves that can't reach alpha, unless they give check. The position scores at most
+            # futility_score without them
+            if futility_score is not None and quiet and not engine.gives_check(move):
+                if futility_score > max_score:
+                    max_score = futility_score
+                if self.stats is not None:
+                    self.stats.futility_prunes += 1
+                continue
+
+            # late move reductions, the moves ordered last rarely turn out best so first see if they beat alpha with a
+            # shallower search
+            reduce = self.late_move_reductions and selective and not in_check and depth >= LMR_MIN_DEPTH and \
+                index >= LMR_FULL_DEPTH_MOVES and quiet and move not in killers and not engine.gives_check(move)
+
+            engine.push(move)
             next_moves = engine.valid_moves()
-            score = -self.negamax_alphabeta_helper(next_moves, engine, depth-1, -beta, -alpha, -turn_base)
+            score = None
+            if reduce:
+                score = -self.negamax_alphabeta_helper(next_moves, engine, depth - 2, -alpha - NULL_WINDOW, -alpha,
+                                                       -turn_base)
+                if self.stats is not None:
+                    self.stats.reductions += 1
+                    if score > alpha:
+                        self.stats.re_searches += 1
+            if score is None or score > alpha:
+                score = -self.negamax_alphabeta_helper(next_moves, engine, depth-1, -beta, -alpha, -turn_base)
             if score > max_score:
                 max_score = score
-                if depth == DEPTH:
-                    next_move = move
-            engine.undo_move()
+                best_move = move
+                if depth == self.root_depth:
+                    self.root_best_move = move
+            engine.pop()
             if max_score > alpha:
                 alpha = max_score
             if alpha >= beta:
+                self.record_cutoff(move, depth, ply)
+                if self.stats is not None:
+                    self.stats.beta_cutoffs += 1
+                    if move is moves[0]:
+                        self.stats.first_move_cutoffs += 1
                 break
+
+        # remember the result, and whether it is exact or only a bound because of the alpha-beta window
+        if max_score <= original_alpha:
+            flag = UPPER_BOUND
+        elif max_score >= beta:
+            flag = LOWER_BOUND
+        else:
+            flag = EXACT
+        self.transposition_table.store(key, depth, max_score, flag, best_move.move_id if best_move else None)
+
+        return max_score
+
+    def quiescence(self, moves, engine, alpha, beta, turn_base):
+        """
+        Searches only captures (and promotions) until the position is quiet, so the score isn't taken right after a
+        piece was captured but before it is taken back. The side to move can also stand pat: keep the score of the
+        board as it is instead of capturing. When in check every move is searched, since standing pat isn't an option.
+        """
+        self.qnodes += 1
+        self.check_budget()
+
+        # checkmate, stalemate or the board score, from the side to move's point of view
+        stand_pat = turn_base * engine.get_material_score(hard_mode=True)
+        if not moves or engine.checkmate or engine.stalemate:
+            return stand_pat
+
+        king_location = engine.get_king_location()[0 if engine.white_turn else 1]
+        in_check = engine.is_square_attacked(king_location[0], king_location[1], BLACK if engine.white_turn else WHITE)
+
+        if in_check:
+            max_score = -CHECKMATE
+            candidates = moves
+        else:
+            # the side to move doesn't have to capture, so the board score is already a lower bound
+            if stand_pat >= beta:
+                return stand_pat
+            max_score = stand_pat
+
+            # delta pruning, if winning a queen can't raise alpha no capture will
+            if stand_pat + PIECE_STRENGTH['Q'] + DELTA_MARGIN < alpha:
+                return stand_pat
+            alpha = max(alpha, stand_pat)
+
+            candidates = []
+            for move in moves:
+                if move.piece_captured is not None:
+                    gain = PIECE_STRENGTH[move.piece_captured[1]]
+                elif move.pawn_promotion:
+                    gain = 0
+                else:
+                    continue
+                if move.pawn_promotion:
+                    gain += PIECE_STRENGTH['Q'] - PIECE_STRENGTH['P']
+
+                # delta pruning per move, this capture can't raise alpha even with the margin
+                if stand_pat + gain + DELTA_MARGIN <= alpha:
+                    continue
+
+                # a capture that loses material once the piece is taken back won't help either
+                if move.piece_captured is not None and \
+                        PIECE_STRENGTH[move.piece_captured[1]] < PIECE_STRENGTH[move.piece_moved[1]] and \
+                        engine.static_exchange(move) < 0:
+                    continue
+                candidates.append(move)
+
+        # captures by MVV-LVA, there is no hash move or killers out here
+        candidates = sorted(candidates, key=lambda move: self.score_move(move, None, (None, None), engine),
+                            reverse=True)
+        for move in candidates:
+            engine.push(move)
+            next_moves = engine.valid_moves()
+            score = -self.quiescence(next_moves, engine, -beta, -alpha, -turn_base)
+            engine.pop()
+            if score > max_score:
+                max_score = score
+            if max_score > alpha:
+                alpha = max_score
+            if alpha >= beta:
+                break
+
         return max_score
-    
\ No newline at end of file
@@ -0,0 +1,147 @@
+import argparse
+import sys
+import time
+
+from Chess.chess_engine import ChessEngine
+from Chess.constants import *
+
+# numpy is optional, only the batch evaluation needs it
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Batch evaluation with numpy
+# A board is encoded as 64 int8 piece codes (row * 8 + col) and PIECE_STRENGTH / PIECE_POSITIONAL_SCORE become lookup
+# arrays indexed by piece code (and square), so scoring any number of boards is a couple of array lookups and a sum
+# instead of a python loop per board. The scores are the same as get_material_score: positive is good for white.
+#
+# usage: python -m Chess.batch_eval positions.txt [--material-only]   (one FEN per line)
+
+# piece codes, 0 is an empty square
+PIECE_CODE_NAMES = (None, 'wP', 'wN', 'wB', 'wR', 'wQ', 'wK', 'bP', 'bN', 'bB', 'bR', 'bQ', 'bK')
+PIECE_CODES = {piece: code for code, piece in enumerate(PIECE_CODE_NAMES)}
+
+
+def _score_tables():
+    """
+    Returns the (material, positional) lookup arrays, material[code] and positional[code][square], signed so white
+    pieces count up and black pieces count down
+    """
+    material = np.zeros(len(PIECE_CODE_NAMES))
+    positional = np.zeros((len(PIECE_CODE_NAMES), 64))
+    for code, piece in enumerate(PIECE_CODE_NAMES):
+        if piece is None:
+            continue
+        sign = 1 if piece[0] == WHITE else -1
+        material[code] = sign * PIECE_STRENGTH[piece[1]]
+        if piece[1] != KING:
+            positional[code] = [sign * PIECE_POSITIONAL_SCORE[piece][row][col] for row in range(8) for col in range(8)]
+    return material, positional
+
+
+if np is not None:
+    MATERIAL_TABLE, POSITIONAL_TABLE = _score_tables()
+    SQUARES = np.arange(64)
+
+
+def require_numpy():
+    if np is None:
+        raise ImportError('Batch evaluation needs numpy (pip install numpy)')
+
+
+def encode_board(board):
+    """
+    Returns the board (list of lists of piece strings) as an int8 array of 64 piece codes
+    """
+    require_numpy()
+    return np.array([PIECE_CODES[piece] for row in board for piece in row], dtype=np.int8)
+
+
+def evaluate_boards(boards, hard_mode=True):
+    """
+    Returns the scores of an (N, 64) int8 array of boards. hard_mode adds the positional scores, like
+    get_material_score. Checkmate and stalemate are not looked at.
+    """
+    require_numpy()
+    boards = np.asarray(boards, dtype=np.intp).reshape(-1, 64)
+    scores = MATERIAL_TABLE[boards].sum(axis=1)
+    if hard_mode:
+        scores += POSITIONAL_TABLE[boards, SQUARES].sum(axis=1)
+    return scores
+
+
+def child_boards(board, moves):
+    """
+    Returns an (N, 64) int8 array of the boards after each of the moves, from the encoded board of the position they
+    are made from. Plain moves and captures are done for all the moves at once, promotions, enpassant and castling are
+    fixed up afterwards.
+    """
+    require_numpy()
+    count = len(moves)
+    starts = np.fromiter((move.start_row * 8 + move.start_col for move in moves), dtype=np.intp, count=count)
+    ends = np.fromiter((move.end_row * 8 + move.end_col for move in moves), dtype=np.intp, count=count)
+    rows = np.arange(count)
+
+    children = np.repeat(board.reshape(1, 64), count, axis=0)
+    children[rows, ends] = board[starts]
+    children[rows, starts] = 0
+
+    for index, move in enumerate(moves):
+        if move.pawn_promotion:
+            children[index, ends[index]] = PIECE_CODES[move.piece_moved[0] + 'Q']
+        elif move.enpassant_move:
+            children[index, move.start_row * 8 + move.end_col] = 0
+        elif move.castling_move:
+            rook = PIECE_CODES[move.piece_moved[0] + 'R']
+            row_start = move.end_row * 8
+            if move.end_col - move.start_col == 2:
+                children[index, row_start + move.end_col + 1] = 0
+                children[index, row_start + move.end_col - 1] = rook
+            else:
+                children[index, row_start + move.end_col - 2] = 0
+                children[index, row_start + move.end_col + 1] = rook
+    return children
+
+
+def evaluate_children(engine, moves, hard_mode=True):
+    """
+    Returns the scores of the positions after each of the moves of the engine's position, in one vectorized call
+    """
+    if not moves:
+        return []
+    return evaluate_boards(child_boards(encode_board(engine.board), moves), hard_mode)
+
+
+def evaluate_fens(fens, hard_mode=True):
+    """
+    Returns the scores of a list of FEN strings
+    """
+    engine = ChessEngine()
+    boards = []
+    for fen in fens:
+        engine.load_fen(fen)
+        boards.append(encode_board(engine.board))
+    return evaluate_boards(np.array(boards).reshape(-1, 64), hard_mode)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Scores every position of a file of FEN strings')
+    parser.add_argument('positions', help='text file with one FEN per line')
+    parser.add_argument('--material-only', action='store_true', help='leave out the positional scores')
+    args = parser.parse_args(argv)
+
+    with open(args.positions) as positions_file:
+        fens = [line.strip() for line in positions_file if line.strip()]
+
+    start = time.perf_counter()
+    scores = evaluate_fens(fens, not args.material_only)
+    elapsed = time.perf_counter() - start
+    for fen, score in zip(fens, scores):
+        print('{:.2f}\t{}'.format(score, fen))
+    print('{} positions in {:.3f}s'.format(len(fens), elapsed), file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,286 @@
+from Chess.chess_engine import ChessEngine
+from Chess.move import Move
+from Chess.constants import *
+
+# Bitboard backend for the chess engine
+# https://www.chessprogramming.org/Bitboards
+# Each piece type gets a python int used as a set of 64 bits, bit (row * 8 + col) is set when that piece is on the
+# square. Finding where a piece can go is then a lookup in a precomputed attack table (knight, king, pawn) or a walk
+# along a precomputed ray that stops at the first blocker (rook, bishop, queen) instead of stepping square by square.
+
+PIECE_NAMES = ('wP', 'wN', 'wB', 'wR', 'wQ', 'wK', 'bP', 'bN', 'bB', 'bR', 'bQ', 'bK')
+
+# (row, col) steps for the sliding directions, split by whether the square index goes up or down along them so
+# the first blocker can be found with the lowest or highest set bit
+ROOK_DIRECTIONS = ((-1, 0), (0, -1), (1, 0), (0, 1))
+BISHOP_DIRECTIONS = ((-1, -1), (-1, 1), (1, -1), (1, 1))
+
+
+def _square_bit(row, col):
+    return 1 << (row * 8 + col)
+
+
+def _jump_table(steps):
+    """
+    Builds a 64 entry table of the squares reached from each square by a single step in any of the given directions
+    """
+    table = []
+    for square in range(64):
+        row, col = divmod(square, 8)
+        targets = 0
+        for step in steps:
+            if 0 <= row + step[0] < 8 and 0 <= col + step[1] < 8:
+                targets |= _square_bit(row + step[0], col + step[1])
+        table.append(targets)
+    return table
+
+
+def _ray_table(step):
+    """
+    Builds a 64 entry table of every square from each square to the edge of the board in one direction
+    """
+    table = []
+    for square in range(64):
+        row, col = divmod(square, 8)
+        ray = 0
+        row, col = row + step[0], col + step[1]
+        while 0 <= row < 8 and 0 <= col < 8:
+            ray |= _square_bit(row, col)
+            row, col = row + step[0], col + step[1]
+        table.append(ray)
+    return table
+
+
+KNIGHT_ATTACKS = _jump_table(MOVE_DIRECTIONS['N'])
+KING_ATTACKS = _jump_table(MOVE_DIRECTIONS['K'])
+
+# PAWN_ATTACKS[color][square] are the squares a pawn of that color on the square captures on
+PAWN_ATTACKS = {WHITE: _jump_table(((-1, -1), (-1, 1))), BLACK: _jump_table(((1, -1), (1, 1)))}
+
+# (ray table, True if the square index increases along the ray) for each sliding direction
+ROOK_RAYS = [(_ray_table(step), step[0] > 0 or (step[0] == 0 and step[1] > 0)) for step in ROOK_DIRECTIONS]
+BISHOP_RAYS = [(_ray_table(step), step[0] > 0) for step in BISHOP_DIRECTIONS]
+
+
+def slider_attacks(square, occupied, rays):
+    """
+    Returns the squares a slider on the square attacks with the given rays: everything up to and including the first
+    occupied square in each direction
+    """
+    attacks = 0
+    for ray_table, increasing in rays:
+        ray = ray_table[square]
+        blockers = ray & occupied
+        if blockers:
+            # the first blocker is the nearest one, cut the ray off behind it
+            if increasing:
+                first = (blockers & -blockers).bit_length() - 1
+            else:
+                first = blockers.bit_length() - 1
+            ray ^= ray_table[first]
+        attacks |= ray
+    return attacks
+
+
+def iter_squares(bitboard):
+    """
+    Yields the index of every set bit of the bitboard
+    """
+    while bitboard:
+        lowest = bitboard & -bitboard
+        yield lowest.bit_length() - 1
+        bitboard ^= lowest
+
+
+class BitboardEngine(ChessEngine):
+    """
+    ChessEngine that generates moves and answers attack queries from bitboards. self.board is still kept up to date by
+    push and pop (which make_move and undo_move go through), so the UI, the AI and everything else reading the board
+    works the same with either backend.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.load_bitboards()
+
+    def load_bitboards(self):
+        """
+        Builds the bitboards from self.board, for setting up a new position
+        """
+        self.bitboards = {piece: 0 for piece in PIECE_NAMES}
+        self.color_occupancy = {WHITE: 0, BLACK: 0}
+
+        # what the bitboards currently hold on each square, used to clear a square when it changes
+        self.square_pieces = [None] * 64
+
+        for row in range(8):
+            for col in range(8):
+                self.sync_square(row, col)
+
+    def load_fen(self, fen):
+        """
+        Sets up the position described by a FEN string and rebuilds the bitboards for it
+        """
+        super().load_fen(fen)
+        self.load_bitboards()
+
+    def sync_square(self, row, col):
+        """
+        Updates the bitboards for a single square to match self.board
+        """
+        square = row * 8 + col
+        bit = 1 << square
+        old_piece = self.square_pieces[square]
+        new_piece = self.board[row][col]
+        if old_piece == new_piece:
+            return
+
+        if old_piece is not None:
+            self.bitboards[old_piece] ^= bit
+            self.color_occupancy[old_piece[0]] ^= bit
+        if new_piece is not None:
+            self.bitboards[new_piece] |= bit
+            self.color_occupancy[new_piece[0]] |= bit
+        self.square_pieces[square] = new_piece
+
+    def sync_move(self, move):
+        """
+        Updates the bitboards for every square a move changes, including the enpassant capture and castling rook
+        """
+        self.sync_square(move.start_row, move.start_col)
+        self.sync_square(move.end_row, move.end_col)
+        if move.enpassant_move:
+            self.sync_square(move.start_row, move.end_col)
+        elif move.castling_move:
+            if move.end_col - move.start_col == 2:
+                self.sync_square(move.end_row, move.end_col - 1)
+                self.sync_square(move.end_row, move.end_col + 1)
+            else:
+                self.sync_square(move.end_row, move.end_col + 1)
+                self.sync_square(move.end_row, move.end_col - 2)
+
+    def push(self, move: Move):
+        """
+        Makes the move on the board and mirrors it on the bitboards
+        """
+        super().push(move)
+        self.sync_move(move)
+
+    def pop(self):
+        """
+        Takes back the last move on the board and mirrors it on the bitboards
+        """
+        undone_move = self.move_stack[-1]
+        super().pop()
+
+        # nothing moved for a null move
+        if undone_move is not None:
+            self.sync_move(undone_move)
+
+    def is_square_attacked(self, row, col, by_color, occupied=None) -> bool:
+        """
+        Returns whether any piece of by_color attacks the square, by intersecting the attack tables of the square with
+        the attacker's bitboards. occupied can be passed to look through a piece that is about to move.
+        """
+        square = row * 8 + col
+        bitboards = self.bitboards
+        if occupied is None:
+            occupied = self.color_occupancy[WHITE] | self.color_occupancy[BLACK]
+
+        # a pawn attacks the square from where an enemy pawn on the square would capture
+        if PAWN_ATTACKS[BLACK if by_color == WHITE else WHITE][square] & bitboards[by_color + 'P']:
+            return True
+        if KNIGHT_ATTACKS[square] & bitboards[by_color + 'N']:
+            return True
+        if KING_ATTACKS[square] & bitboards[by_color + 'K']:
+            return True
+
+        queens = bitboards[by_color + 'Q']
+        if slider_attacks(square, occupied, ROOK_RAYS) & (bitboards[by_color + 'R'] | queens):
+            return True
+        if slider_attacks(square, occupied, BISHOP_RAYS) & (bitboards[by_color + 'B'] | queens):
+            return True
+
+        return False
+
+    def gives_check(self, move):
+        """
+        Returns whether the move of the turn player checks the other king. Like ChessEngine.gives_check only the squares
+        the move changes are set, but on the bitboards too since is_square_attacked reads them and not the board.
+        """
+        board = self.board
+        changes = self.move_squares(move)
+        saved = [board[change_row][change_col] for change_row, change_col, _piece in changes]
+        for change_row, change_col, piece in changes:
+            board[change_row][change_col] = piece
+        self.sync_move(move)
+
+        color = move.piece_moved[0]
+        king_row, king_col = self.black_king_loc if color == WHITE else self.white_king_loc
+        check = self.is_square_attacked(king_row, king_col, color)
+
+        for (change_row, change_col, _piece), piece in zip(reversed(changes), reversed(saved)):
+            board[change_row][change_col] = piece
+        self.sync_move(move)
+        return check
+
+    def is_king_move_into_check(self, move, color):
+        """
+        Returns whether the king would be attacked on the end square of the move, looking through the square it leaves
+        """
+        occupied = self.color_occupancy[WHITE] | self.color_occupancy[BLACK]
+        occupied &= ~(1 << (move.start_row * 8 + move.start_col))
+        return self.is_square_attacked(move.end_row, move.end_col, BLACK if color == WHITE else WHITE, occupied)
+
+    def all_moves(self):
+        """
+        Returns a list of all moves to empty space or to capture enemy piece for piece of the turn player
+        Does not consider if the move puts the turn player in check/checkmate
+        """
+        all_moves = []
+        board = self.board
+        bitboards = self.bitboards
+
+        color = WHITE if self.white_turn else BLACK
+        own = self.color_occupancy[color]
+        enemy = self.color_occupancy[BLACK if self.white_turn else WHITE]
+        occupied = own | enemy
+
+        # pawns push into empty squares, capture enemy pieces and the enpassant square
+        forward = -8 if self.white_turn else 8
+        start_row = 6 if self.white_turn else 1
+        enpassant = _square_bit(*self.enpassant_coords) & ~occupied if self.enpassant_coords else 0
+        for square in iter_squares(bitboards[color + 'P']):
+            row, col = divmod(square, 8)
+            push = square + forward
+            if not occupied & (1 << push):
+                all_moves.append(Move((row, col), divmod(push, 8), board))
+                if row == start_row and not occupied & (1 << (push + forward)):
+                    all_moves.append(Move((row, col), divmod(push + forward, 8), board))
+
+            attacks = PAWN_ATTACKS[color][square]
+            for target in iter_squares(attacks & enemy):
+                all_moves.append(Move((row, col), divmod(target, 8), board))
+            if attacks & enpassant:
+                all_moves.append(Move((row, col), self.enpassant_coords, board, enpassant=True))
+
+        # every other piece can go to any square it attacks that isn't its own
+        for piece_type in 'NBRQK':
+            for square in iter_squares(bitboards[color + piece_type]):
+                if piece_type == 'N':
+                    targets = KNIGHT_ATTACKS[square]
+                elif piece_type == 'K':
+                    targets = KING_ATTACKS[square]
+                elif piece_type == 'B':
+                    targets = slider_attacks(square, occupied, BISHOP_RAYS)
+                elif piece_type == 'R':
+                    targets = slider_attacks(square, occupied, ROOK_RAYS)
+                else:
+                    targets = slider_attacks(square, occupied, ROOK_RAYS) | slider_attacks(square, occupied,
+                                                                                           BISHOP_RAYS)
+
+                start = divmod(square, 8)
+                for target in iter_squares(targets & ~own):
+                    all_moves.append(Move(start, divmod(target, 8), board))
+
+        return all_moves
@@ -149,7 +149,7 @@ class Board:
         draw_captures("wN", (WIDTH + 5, 255))
         draw_captures("wQ", (WIDTH + 5, 275))
 
-        n_text = self.font.render("Number of Turns: {turns}".format(turns=len(engine.get_move_log())), True, WHITEISH)
+        n_text = self.font.render("Number of Turns: {turns}".format(turns=len(engine.move_log)), True, WHITEISH)
         win.blit(n_text, (WIDTH + 5, 310))
 
         # Draw Move Log
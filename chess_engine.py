@@ -1,6 +1,53 @@
+import argparse
+import sys
+
 from Chess.move import Move
 from Chess.constants import *
-import copy
+from Chess.zobrist import PIECE_KEYS, BLACK_TO_MOVE_KEY, CASTLING_KEYS, ENPASSANT_KEYS
+
+# castling rights are stored as bits of a single int
+WHITE_KING_SIDE = 1
+BLACK_KING_SIDE = 2
+WHITE_QUEEN_SIDE = 4
+BLACK_QUEEN_SIDE = 8
+ALL_CASTLING_RIGHTS = WHITE_KING_SIDE | BLACK_KING_SIDE | WHITE_QUEEN_SIDE | BLACK_QUEEN_SIDE
+
+# rights lost when a move starts or ends on the square of a king or rook that hasn't moved yet (ending on it means the
+# rook was captured)
+CASTLING_MASKS = {
+    (7, 4): WHITE_KING_SIDE | WHITE_QUEEN_SIDE,
+    (7, 7): WHITE_KING_SIDE,
+    (7, 0): WHITE_QUEEN_SIDE,
+    (0, 4): BLACK_KING_SIDE | BLACK_QUEEN_SIDE,
+    (0, 7): BLACK_KING_SIDE,
+    (0, 0): BLACK_QUEEN_SIDE
+}
+
+# castling letters in FEN strings, in the order they are written
+FEN_CASTLING = (('K', WHITE_KING_SIDE), ('Q', WHITE_QUEEN_SIDE), ('k', BLACK_KING_SIDE), ('q', BLACK_QUEEN_SIDE))
+
+START_FEN = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+
+# most positions valid_moves keeps the moves of, enough for a search without holding on to every Move it made
+MOVE_CACHE_SIZE = 4096
+
+# static_exchange takes back with the cheapest piece first, in this order
+SEE_ATTACKER_RANK = {piece_type: rank for rank, piece_type in enumerate('PNBRQK')}
+
+# for each square, the squares a knight jump away and the squares along each line out from it (with the sliders that
+# move along that line), so least_valuable_attacker doesn't redo the bounds checks every time
+KNIGHT_SQUARES = [[[(row + mov_dir[0], col + mov_dir[1]) for mov_dir in MOVE_DIRECTIONS['N']
+                    if 0 <= row + mov_dir[0] < 8 and 0 <= col + mov_dir[1] < 8]
+                   for col in range(8)] for row in range(8)]
+LINES = [[[('RQ' if mov_dir[0] == 0 or mov_dir[1] == 0 else 'BQ',
+            [(row + step * mov_dir[0], col + step * mov_dir[1]) for step in range(1, 8)
+             if 0 <= row + step * mov_dir[0] < 8 and 0 <= col + step * mov_dir[1] < 8])
+           for mov_dir in MOVE_DIRECTIONS['Q']]
+          for col in range(8)] for row in range(8)]
+
+# PIECE_POSITIONAL_SCORE for every piece, kings don't get a positional score
+PIECE_SQUARE_SCORES = {piece: PIECE_POSITIONAL_SCORE[piece] if piece[1] != KING else [[0] * 8 for _row in range(8)]
+                       for piece in PIECES}
 
 
 class ChessEngine:
@@ -25,43 +72,100 @@ class ChessEngine:
             ['wR', 'wN', 'wB', 'wQ', 'wK', 'wB', 'wN', 'wR']
         ]
         self.white_turn = True
-        self.move_log = []  # stores Move objects
-        self.chess_notation = []  # stores chess notation of the start and end square of the move
+        self.move_stack = []  # stores every Move made with push, including the ones in move_log, for pop
+        self.move_log = []  # stores Move objects, notation strings are only built from them when asked for
         self.pieces_captured = []  # store pieces that have been captured
-        self.legible_move_list = []  # stores full move information string for printing on the UI
 
         # king locations
         self.white_king_loc = (7, 4)
         self.black_king_loc = (0, 4)
 
+        # {(row, col): piece} for each color so finding the pieces doesn't mean scanning all 64 squares
+        self.piece_locations = {}
+        self.load_piece_locations()
+
         # used to save the enpassant coords and logs
         self.enpassant_coords = ()
         self.enpassant_log = [self.enpassant_coords]
 
+        # castling rights bits and the rights before each move so undo can restore them
+        self.castling_rights = ALL_CASTLING_RIGHTS
+        self.castling_log = []
+
         # keep track of check mate and stalemate
         self.checkmate = False
         self.stalemate = False
 
-        # board state dictionary for stalemate
+        # zobrist key of the current position, updated incrementally by make_move and restored by undo_move
+        self.position_hash = self.compute_position_key()
+        self.position_hash_log = [self.position_hash]
+
+        # white minus black totals of PIECE_STRENGTH and of the positional scores, updated by push as pieces move and
+        # restored by pop, so the evaluation doesn't have to look at the board. debug_eval checks them against a full
+        # scan of the board on every get_material_score call.
+        self.material_score, self.positional_score = self.compute_scores()
+        self.score_log = []
+        self.debug_eval = False
+
+        # board state dictionary for stalemate, counts how many times each position key has been reached
         self.board_state = {}
 
+        # valid_moves results by position key, and how often it was asked for and had to generate the moves
+        self.move_cache = {}
+        self.move_cache_lookups = 0
+        self.move_cache_misses = 0
+
     def make_move(self, move: Move):
         """
         Accepts a Move object to update the board and move log
         Does not validate the move!!
         """
-
-        # update self.board by moving the piece to the coordinates
-        self.board[move.start_row][move.start_col] = None
-        self.board[move.end_row][move.end_col] = move.get_piece_moved()
+        self.push(move)
 
         # update the lists pertaining to move history
         self.move_log.append(move)
-        self.chess_notation.append(move.get_chess_notation())
-        self.legible_move_list.append(move.get_move_legible())
         if move.get_piece_captured():
             self.pieces_captured.append(move.piece_captured)
 
+        # count the new position for threefold repetition
+        self.board_state[self.position_hash] = self.board_state.get(self.position_hash, 0) + 1
+
+    def undo_move(self):
+        """
+        Undoes the last move
+        """
+
+        # make sure that there is actually move to undo or error is thrown
+        if len(self.move_log) > 0:
+            # get the Move object being undone and remove the last entry from all the logs
+            undone_move = self.move_log.pop()
+            if undone_move.piece_captured is not None:
+                self.pieces_captured.pop()
+
+            # remove the current position from the repetition count
+            self.board_state[self.position_hash] = self.board_state.get(self.position_hash, 0) - 1
+            if self.board_state[self.position_hash] == 0:
+                self.board_state.pop(self.position_hash)
+
+            self.pop()
+
+    def push(self, move: Move):
+        """
+        Makes a move for internal and search use. Only the board, king locations, turn player, enpassant, castling
+        rights and position key are updated, nothing is added to the move history shown by the UI. Undo with pop.
+        Does not validate the move!!
+        """
+
+        # remember what the key is built from before the move changes it
+        position_hash = self.position_hash
+        prev_enpassant = self.enpassant_coords
+        prev_castling_rights = self.castling_rights
+
+        # update self.board by moving the piece to the coordinates
+        self.board[move.start_row][move.start_col] = None
+        self.board[move.end_row][move.end_col] = move.get_piece_moved()
+
+        self.move_stack.append(move)
         self.change_turn()
 
         # update king location
@@ -87,6 +191,21 @@ class ChessEngine:
                 self.board[move.end_row][move.end_col + 1] = move.piece_moved[0] + 'R'
                 self.board[move.end_row][move.end_col - 2] = None
 
+        # move the piece in the piece lists too, as whatever ended up on the end square (promotion included)
+        own_pieces = self.piece_locations[move.piece_moved[0]]
+        del own_pieces[(move.start_row, move.start_col)]
+        own_pieces[(move.end_row, move.end_col)] = self.board[move.end_row][move.end_col]
+        if move.piece_captured is not None:
+            if move.enpassant_move:
+                del self.piece_locations[move.piece_captured[0]][(move.start_row, move.end_col)]
+            else:
+                del self.piece_locations[move.piece_captured[0]][(move.end_row, move.end_col)]
+        elif move.castling_move:
+            if move.end_col - move.start_col == 2:
+                own_pieces[(move.end_row, move.end_col - 1)] = own_pieces.pop((move.end_row, move.end_col + 1))
+            else:
+                own_pieces[(move.end_row, move.end_col + 1)] = own_pieces.pop((move.end_row, move.end_col - 2))
+
         # if current pawn piece moved two places, then save enpassant square to capture else set to empty
         if (move.piece_moved == 'wP' or move.piece_moved == 'bP') and abs(move.start_row - move.end_row) == 2:
             self.enpassant_coords = ((move.start_row + move.end_row) // 2, move.end_col)
@@ -96,128 +215,348 @@ class ChessEngine:
         # append the current enpassant coords to the log
         self.enpassant_log.append(self.enpassant_coords)
 
-        # add the current board state to the dictionary by replacing none to --, join into string, and adding it as key
-        board_copy = copy.deepcopy(self.board)
-        remove_none_list = [['--' if square is None else square for square in row] for row in board_copy]
-        board_string = ''.join([square for innerlist in remove_none_list for square in innerlist])
-        self.board_state[board_string] = self.board_state.get(board_string, 0) + 1
+        # moving a king or rook off its starting square, or capturing a rook on it, loses those castling rights
+        self.castling_log.append(prev_castling_rights)
+        start_square = (move.start_row, move.start_col)
+        end_square = (move.end_row, move.end_col)
+        if start_square in CASTLING_MASKS:
+            self.castling_rights &= ~CASTLING_MASKS[start_square]
+        if end_square in CASTLING_MASKS:
+            self.castling_rights &= ~CASTLING_MASKS[end_square]
+
+        # XOR the moved piece out of its start square and whatever ended up on the end square in (promotion included)
+        position_hash ^= PIECE_KEYS[move.piece_moved][move.start_row][move.start_col]
+        position_hash ^= PIECE_KEYS[self.board[move.end_row][move.end_col]][move.end_row][move.end_col]
+
+        # the captured piece is removed from the end square or from behind the pawn for enpassant
+        if move.enpassant_move:
+            position_hash ^= PIECE_KEYS[move.piece_captured][move.start_row][move.end_col]
+        elif move.piece_captured is not None:
+            position_hash ^= PIECE_KEYS[move.piece_captured][move.end_row][move.end_col]
+
+        # the rook jumps over the king when castling
+        if move.castling_move:
+            rook = move.piece_moved[0] + 'R'
+            if move.end_col - move.start_col == 2:
+                position_hash ^= PIECE_KEYS[rook][move.end_row][move.end_col + 1]
+                position_hash ^= PIECE_KEYS[rook][move.end_row][move.end_col - 1]
+            else:
+                position_hash ^= PIECE_KEYS[rook][move.end_row][move.end_col - 2]
+                position_hash ^= PIECE_KEYS[rook][move.end_row][move.end_col + 1]
+
+        # side to move, enpassant file and castling rights
+        position_hash ^= BLACK_TO_MOVE_KEY
+        if prev_enpassant:
+            position_hash ^= ENPASSANT_KEYS[prev_enpassant[1]]
+        if self.enpassant_coords:
+            position_hash ^= ENPASSANT_KEYS[self.enpassant_coords[1]]
+        if self.castling_rights != prev_castling_rights:
+            position_hash ^= CASTLING_KEYS[prev_castling_rights] ^ CASTLING_KEYS[self.castling_rights]
+
+        self.position_hash = position_hash
+        self.position_hash_log.append(position_hash)
+
+        # the scores change by what left and entered the squares, from the mover's side (white adds, black subtracts)
+        self.score_log.append((self.material_score, self.positional_score))
+        sign = 1 if move.piece_moved[0] == WHITE else -1
+        end_piece = self.board[move.end_row][move.end_col]
+        material = PIECE_STRENGTH[end_piece[1]] - PIECE_STRENGTH[move.piece_moved[1]]
+        positional = PIECE_SQUARE_SCORES[end_piece][move.end_row][move.end_col] - \
+            PIECE_SQUARE_SCORES[move.piece_moved][move.start_row][move.start_col]
+        if move.piece_captured is not None:
+            capture_row = move.start_row if move.enpassant_move else move.end_row
+            material += PIECE_STRENGTH[move.piece_captured[1]]
+            positional += PIECE_SQUARE_SCORES[move.piece_captured][capture_row][move.end_col]
+        elif move.castling_move:
+            rook_scores = PIECE_SQUARE_SCORES[move.piece_moved[0] + 'R'][move.end_row]
+            if move.end_col - move.start_col == 2:
+                positional += rook_scores[move.end_col - 1] - rook_scores[move.end_col + 1]
+            else:
+                positional += rook_scores[move.end_col + 1] - rook_scores[move.end_col - 2]
+        self.material_score += sign * material
+        self.positional_score += sign * positional
 
-    def undo_move(self):
+    def push_null(self):
         """
-        Undoes the last move
+        Passes the turn without moving a piece, for null move pruning in the search. The turn, position key and
+        enpassant square change like for a move and None goes on move_stack in its place, so pop takes it back.
+        Never call it when the turn player is in check.
         """
+        position_hash = self.position_hash ^ BLACK_TO_MOVE_KEY
+        if self.enpassant_coords:
+            position_hash ^= ENPASSANT_KEYS[self.enpassant_coords[1]]
 
-        # make sure that there is actually move to undo or error is thrown
-        if len(self.move_log) > 0:
-            # get the Move object being undone and remove the last entry from all the logs
-            undone_move = self.move_log.pop()
-            self.chess_notation.pop()
-            self.legible_move_list.pop()
-            if undone_move.piece_captured is not None:
-                self.pieces_captured.pop()
+        self.move_stack.append(None)
+        self.change_turn()
+        self.enpassant_coords = ()
+        self.enpassant_log.append(self.enpassant_coords)
+        self.castling_log.append(self.castling_rights)
+        self.score_log.append((self.material_score, self.positional_score))
+        self.position_hash = position_hash
+        self.position_hash_log.append(position_hash)
 
-            # remove the current board state to the dictionary by replacing none to --, join into string, subtract 1
-            board_copy = copy.deepcopy(self.board)
-            remove_none_list = [['--' if square is None else square for square in row] for row in board_copy]
-            board_string = ''.join([square for innerlist in remove_none_list for square in innerlist])
-            self.board_state[board_string] = self.board_state.get(board_string, 0) - 1
-            if self.board_state[board_string] == 0:
-                self.board_state.pop(board_string)
+    def pop(self):
+        """
+        Takes back the last move made with push (or the pass made with push_null)
+        """
+        undone_move = self.move_stack.pop()
 
-            # undo the piece locations
-            self.board[undone_move.start_row][undone_move.start_col] = undone_move.piece_moved
-            self.board[undone_move.end_row][undone_move.end_col] = undone_move.piece_captured
+        # restore the previous key and scores
+        self.position_hash_log.pop()
+        self.position_hash = self.position_hash_log[-1]
+        self.material_score, self.positional_score = self.score_log.pop()
 
-            # change the turn
+        # a null move only changed the turn and the enpassant square
+        if undone_move is None:
             self.change_turn()
-
-            # update king location
-            if undone_move.piece_moved == 'wK':
-                self.white_king_loc = (undone_move.start_row, undone_move.start_col)
-            elif undone_move.piece_moved == 'bK':
-                self.black_king_loc = (undone_move.start_row, undone_move.start_col)
-
-            # if a move that was undone was an enpassant then reset the values of the square
-            if undone_move.enpassant_move:
-                self.board[undone_move.end_row][undone_move.end_col] = None
-                self.board[undone_move.start_row][undone_move.end_col] = undone_move.piece_captured
-
-            # pop the moves of enpassant and set the current coords to the last element in the list
             self.enpassant_log.pop()
             self.enpassant_coords = self.enpassant_log[-1]
-
-            # if castle move undo the move
-            if undone_move.castling_move:
-                if undone_move.end_col - undone_move.start_col == 2:
-                    self.board[undone_move.end_row][undone_move.end_col + 1] = self.board[undone_move.end_row][
-                        undone_move.end_col - 1]
-                    self.board[undone_move.end_row][undone_move.end_col - 1] = None
-                else:
-                    self.board[undone_move.end_row][undone_move.end_col - 2] = self.board[undone_move.end_row][
-                        undone_move.end_col + 1]
-                    self.board[undone_move.end_row][undone_move.end_col + 1] = None
-
-            # undo the states when using undo
+            self.castling_rights = self.castling_log.pop()
             self.checkmate = False
             self.stalemate = False
+            return
+
+        # undo the piece locations
+        self.board[undone_move.start_row][undone_move.start_col] = undone_move.piece_moved
+        self.board[undone_move.end_row][undone_move.end_col] = undone_move.piece_captured
+
+        # change the turn
+        self.change_turn()
+
+        # update king location
+        if undone_move.piece_moved == 'wK':
+            self.white_king_loc = (undone_move.start_row, undone_move.start_col)
+        elif undone_move.piece_moved == 'bK':
+            self.black_king_loc = (undone_move.start_row, undone_move.start_col)
+
+        # if a move that was undone was an enpassant then reset the values of the square
+        if undone_move.enpassant_move:
+            self.board[undone_move.end_row][undone_move.end_col] = None
+            self.board[undone_move.start_row][undone_move.end_col] = undone_move.piece_captured
+
+        # pop the moves of enpassant and set the current coords to the last element in the list
+        self.enpassant_log.pop()
+        self.enpassant_coords = self.enpassant_log[-1]
+
+        # restore the castling rights from before the move
+        self.castling_rights = self.castling_log.pop()
+
+        # if castle move undo the move
+        if undone_move.castling_move:
+            if undone_move.end_col - undone_move.start_col == 2:
+                self.board[undone_move.end_row][undone_move.end_col + 1] = self.board[undone_move.end_row][
+                    undone_move.end_col - 1]
+                self.board[undone_move.end_row][undone_move.end_col - 1] = None
+            else:
+                self.board[undone_move.end_row][undone_move.end_col - 2] = self.board[undone_move.end_row][
+                    undone_move.end_col + 1]
+                self.board[undone_move.end_row][undone_move.end_col + 1] = None
+
+        # put the piece lists back the same way
+        own_pieces = self.piece_locations[undone_move.piece_moved[0]]
+        del own_pieces[(undone_move.end_row, undone_move.end_col)]
+        own_pieces[(undone_move.start_row, undone_move.start_col)] = undone_move.piece_moved
+        if undone_move.piece_captured is not None:
+            if undone_move.enpassant_move:
+                self.piece_locations[undone_move.piece_captured[0]][(undone_move.start_row, undone_move.end_col)] = \
+                    undone_move.piece_captured
+            else:
+                self.piece_locations[undone_move.piece_captured[0]][(undone_move.end_row, undone_move.end_col)] = \
+                    undone_move.piece_captured
+        elif undone_move.castling_move:
+            if undone_move.end_col - undone_move.start_col == 2:
+                own_pieces[(undone_move.end_row, undone_move.end_col + 1)] = \
+                    own_pieces.pop((undone_move.end_row, undone_move.end_col - 1))
+            else:
+                own_pieces[(undone_move.end_row, undone_move.end_col - 2)] = \
+                    own_pieces.pop((undone_move.end_row, undone_move.end_col + 1))
+
+        # the position that was left can't have been over
+        self.checkmate = False
+        self.stalemate = False
 
     def valid_moves(self):
         """
         moves considering if a check or checkmate can happen, so this function will filter out those moves and not allow
         for the player to make those
+        The moves and the checkmate/stalemate status are cached by position key, so asking again for a position that
+        hasn't changed (e.g. every frame of the UI) is a dictionary lookup. The returned list is shared with the cache,
+        copy it before changing it.
         """
 
-        # save the current enpassant to restore it later
-        temp_enpassant = self.enpassant_coords
+        self.move_cache_lookups += 1
+        cached = self.move_cache.get(self.position_hash)
+        if cached is None:
+            self.move_cache_misses += 1
+            moves, in_check = self.legal_moves()
+
+            # if there are no moves left then it is either checkmate or stalemate
+            checkmate = len(moves) == 0 and in_check
+            stalemate = len(moves) == 0 and not in_check
+
+            # not enough firepower which is kings only
+            if not stalemate:
+                stalemate = len(self.piece_locations[WHITE]) == 1 and len(self.piece_locations[BLACK]) == 1
+
+            # the cache only has to be big enough for the UI and a search's worth of positions, drop the oldest entry
+            if len(self.move_cache) >= MOVE_CACHE_SIZE:
+                del self.move_cache[next(iter(self.move_cache))]
+            cached = (moves, checkmate, stalemate)
+            self.move_cache[self.position_hash] = cached
+
+        moves, checkmate, stalemate = cached
+        if checkmate:
+            self.checkmate = True
+        if stalemate:
+            self.stalemate = True
 
-        # generate all possible moves for the current color
-        moves = self.all_moves()
+        # threefold repetition depends on the game history rather than the position so it isn't cached, the position
+        # that was just reached is the only one whose count can have gone up
+        if self.board_state.get(self.position_hash, 0) >= 3 and self.stalemate is False:
+            self.stalemate = True
+
+        return moves
+
+    def legal_moves(self):
+        """
+        Generates the legal moves of the turn player without using the cache. Returns the list of moves and whether
+        the turn player is in check.
+        """
 
-        # castling moves need to be made outside all moves
         if self.white_turn:
-            self.castling_moves(self.white_king_loc[0], self.white_king_loc[1], WHITE, moves)
+            color = WHITE
+            king_row, king_col = self.white_king_loc
         else:
-            self.castling_moves(self.black_king_loc[0], self.black_king_loc[1], BLACK, moves)
+            color = BLACK
+            king_row, king_col = self.black_king_loc
 
-        # check if any of the moves would put the turn player in check (invalid move)
-        for i in range(len(moves) - 1, -1, -1):
-            sim_move = moves[i]
-            self.make_move(sim_move)
-            self.change_turn()
+        # find what is checking the king and which pieces are pinned to it once for the whole position
+        pins, checks = self.get_pins_and_checks(king_row, king_col, color)
+        in_check = len(checks) > 0
 
-            # if king is attacked then not a valid move
-            if self.is_in_check(sim_move.get_piece_moved()[0]):
-                moves.remove(moves[i])
+        # generate all possible moves for the current color
+        moves = self.all_moves()
+
+        # castling moves need to be made outside all moves
+        self.castling_moves(king_row, king_col, color, moves)
+
+        # squares a piece other than the king can move to in order to get out of a single check: capturing the
+        # checker or, if it is a slider, blocking anywhere between it and the king
+        block_squares = None
+        if len(checks) == 1:
+            check_row, check_col, check_dir = checks[0]
+            block_squares = {(check_row, check_col)}
+            if self.board[check_row][check_col][1] in 'RBQ':
+                cur_row, cur_col = king_row + check_dir[0], king_col + check_dir[1]
+                while (cur_row, cur_col) != (check_row, check_col):
+                    block_squares.add((cur_row, cur_col))
+                    cur_row += check_dir[0]
+                    cur_col += check_dir[1]
+
+        # keep only the moves that do not leave the turn player in check
+        legal_moves = []
+        for move in moves:
+            if move.piece_moved[1] == 'K':
+                # castling was already checked by castling_moves, other king moves can't go to an attacked square
+                if move.castling_move or not self.is_king_move_into_check(move, color):
+                    legal_moves.append(move)
+
+            elif move.enpassant_move:
+                # enpassant removes two pieces from the same row, which a pin along that row doesn't catch, so
+                # simulate it (it is rare enough not to matter)
+                if not self.is_enpassant_into_check(move, color):
+                    legal_moves.append(move)
+
+            # in double check only the king can move
+            elif len(checks) > 1:
+                continue
+
+            elif block_squares is not None and (move.end_row, move.end_col) not in block_squares:
+                continue
+
+            # a pinned piece can only move along the line between its king and the pinning piece
+            elif (move.start_row, move.start_col) in pins:
+                pin_dir = pins[(move.start_row, move.start_col)]
+                if (move.end_row - king_row) * pin_dir[1] == (move.end_col - king_col) * pin_dir[0]:
+                    legal_moves.append(move)
 
-            self.change_turn()
-            self.undo_move()
-
-        # if there are no moves left then it is either checkmate or stalemate
-        if len(moves) == 0:
-            # if its in check, then it is also checkmate
-            if self.is_in_check(WHITE) or self.is_in_check(BLACK):
-                self.checkmate = True
-            # else its stalemate
             else:
-                self.stalemate = True
+                legal_moves.append(move)
 
-        # threefold repetition
-        if 3 in self.board_state.values() and self.stalemate is False:
-            self.stalemate = True
+        return legal_moves, in_check
 
-        # not enough firepower which is kings only
-        if self.stalemate is False:
-            stalemate_check = True
-            for i in range(len(self.board)):
-                if any(piece in self.board[i] for piece in BOARD_PIECE):
-                    stalemate_check = False
-                    break
-            self.stalemate = stalemate_check
+    def get_pins_and_checks(self, row, col, color):
+        """
+        Looks outward from the square along every queen direction and knight jump for enemy pieces attacking it.
+        Returns the pinned pieces as a dictionary of {(row, col): direction from the square to the pinning piece} and
+        the checks as a list of (row, col, direction) for every enemy piece attacking the square.
+        """
+        pins = {}
+        checks = []
 
-        # restore the current enpassant
-        self.enpassant_coords = temp_enpassant
+        for mov_dir in MOVE_DIRECTIONS['Q']:
+            orthogonal = mov_dir[0] == 0 or mov_dir[1] == 0
+            possible_pin = None
+            cur_row = row + mov_dir[0]
+            cur_col = col + mov_dir[1]
+            distance = 1
 
-        return moves
+            while 0 <= cur_row < 8 and 0 <= cur_col < 8:
+                piece = self.board[cur_row][cur_col]
+                if piece is not None:
+                    # first friendly piece in the direction might be pinned, a second one means nothing is
+                    if piece[0] == color:
+                        if possible_pin is not None:
+                            break
+                        possible_pin = (cur_row, cur_col)
+
+                    # enemy piece that attacks along this direction either checks or pins
+                    else:
+                        piece_type = piece[1]
+                        if (orthogonal and piece_type in 'RQ') or (not orthogonal and piece_type in 'BQ') or \
+                                (distance == 1 and piece_type == 'K') or \
+                                (distance == 1 and piece_type == 'P' and not orthogonal and
+                                 mov_dir[0] == (-1 if color == WHITE else 1)):
+                            if possible_pin is None:
+                                checks.append((cur_row, cur_col, mov_dir))
+                            else:
+                                pins[possible_pin] = mov_dir
+                        break
+
+                cur_row += mov_dir[0]
+                cur_col += mov_dir[1]
+                distance += 1
+
+        # knights jump so they can only check
+        for mov_dir in MOVE_DIRECTIONS['N']:
+            cur_row = row + mov_dir[0]
+            cur_col = col + mov_dir[1]
+            if 0 <= cur_row < 8 and 0 <= cur_col < 8:
+                piece = self.board[cur_row][cur_col]
+                if piece is not None and piece[0] != color and piece[1] == 'N':
+                    checks.append((cur_row, cur_col, mov_dir))
+
+        return pins, checks
+
+    def is_king_move_into_check(self, move, color):
+        """
+        Returns whether the king would be attacked on the end square of the move. The king is lifted off the board
+        while looking so it doesn't block a slider attacking along the line it is moving on.
+        """
+        self.board[move.start_row][move.start_col] = None
+        attacked = self.is_square_attacked(move.end_row, move.end_col, BLACK if color == WHITE else WHITE)
+        self.board[move.start_row][move.start_col] = move.piece_moved
+        return attacked
+
+    def is_enpassant_into_check(self, move, color):
+        """
+        Returns whether making the enpassant move would leave the turn player's king attacked
+        """
+        self.push(move)
+        king_row, king_col = self.white_king_loc if color == WHITE else self.black_king_loc
+        attacked = self.is_square_attacked(king_row, king_col, BLACK if color == WHITE else WHITE)
+        self.pop()
+        return attacked
 
     def is_in_check(self, color, castling_row=0, castling_col=0, castling=False) -> bool:
         """
@@ -235,21 +574,171 @@ class ChessEngine:
                 row = self.black_king_loc[0]
                 col = self.black_king_loc[1]
 
-        # switch to opponent to see the opponent's moves
-        self.change_turn()
-        opponent_moves = self.all_moves()
-
-        # change the turn back
-        self.change_turn()
+        return self.is_square_attacked(row, col, BLACK if color == WHITE else WHITE)
 
-        # loop through the opponent's moves
-        for move in opponent_moves:
-            # if the row and col is the matched what is passed to function that king is attacked
-            if move.end_row == row and move.end_col == col:
-                return True
+    def is_square_attacked(self, row, col, by_color) -> bool:
+        """
+        Returns whether any piece of by_color attacks the square. Instead of generating the opponent's moves this looks
+        outward from the square for a piece that could reach it: a knight a jump away, a pawn or king next to it, or
+        a rook, bishop or queen at the end of a clear line.
+        """
+        board = self.board
+
+        # pawns attack diagonally forward so a white pawn attacking the square sits one row below it
+        pawn_row = row + 1 if by_color == WHITE else row - 1
+        if 0 <= pawn_row < 8:
+            for pawn_col in (col - 1, col + 1):
+                if 0 <= pawn_col < 8:
+                    piece = board[pawn_row][pawn_col]
+                    if piece is not None and piece[0] == by_color and piece[1] == 'P':
+                        return True
+
+        # knights
+        for mov_dir in MOVE_DIRECTIONS['N']:
+            cur_row = row + mov_dir[0]
+            cur_col = col + mov_dir[1]
+            if 0 <= cur_row < 8 and 0 <= cur_col < 8:
+                piece = board[cur_row][cur_col]
+                if piece is not None and piece[0] == by_color and piece[1] == 'N':
+                    return True
+
+        # kings and sliders, the first piece found in each direction is the only one that can attack along it
+        for mov_dir in MOVE_DIRECTIONS['Q']:
+            sliders = 'RQ' if mov_dir[0] == 0 or mov_dir[1] == 0 else 'BQ'
+            cur_row = row + mov_dir[0]
+            cur_col = col + mov_dir[1]
+            adjacent = True
+            while 0 <= cur_row < 8 and 0 <= cur_col < 8:
+                piece = board[cur_row][cur_col]
+                if piece is not None:
+                    if piece[0] == by_color and (piece[1] in sliders or (adjacent and piece[1] == 'K')):
+                        return True
+                    break
+                cur_row += mov_dir[0]
+                cur_col += mov_dir[1]
+                adjacent = False
 
         return False
 
+    def least_valuable_attacker(self, row, col, by_color, removed):
+        """
+        Returns (piece type, row, col) of the cheapest piece of by_color attacking the square, or None. The squares in
+        removed count as empty, they are the pieces that already captured on the square in static_exchange, so the
+        pieces lined up behind them (x-rays) get their turn. Pins are not looked at.
+        """
+        board = self.board
+
+        # pawns first, they are the cheapest
+        pawn_row = row + 1 if by_color == WHITE else row - 1
+        if 0 <= pawn_row < 8:
+            for pawn_col in (col - 1, col + 1):
+                if 0 <= pawn_col < 8:
+                    piece = board[pawn_row][pawn_col]
+                    if piece is not None and piece[0] == by_color and piece[1] == 'P' and \
+                            (pawn_row, pawn_col) not in removed:
+                        return 'P', pawn_row, pawn_col
+
+        # then knights
+        for cur_row, cur_col in KNIGHT_SQUARES[row][col]:
+            piece = board[cur_row][cur_col]
+            if piece is not None and piece[0] == by_color and piece[1] == 'N' and (cur_row, cur_col) not in removed:
+                return 'N', cur_row, cur_col
+
+        # the first piece along each line, the cheapest of them by SEE_ATTACKER_RANK
+        best = None
+        for sliders, squares in LINES[row][col]:
+            adjacent = True
+            for cur_row, cur_col in squares:
+                piece = board[cur_row][cur_col]
+                if piece is not None and (cur_row, cur_col) not in removed:
+                    if piece[0] == by_color and (piece[1] in sliders or (adjacent and piece[1] == 'K')):
+                        if best is None or SEE_ATTACKER_RANK[piece[1]] < SEE_ATTACKER_RANK[best[0]]:
+                            best = (piece[1], cur_row, cur_col)
+                    break
+                adjacent = False
+
+        return best
+
+    def static_exchange(self, move):
+        """
+        Static exchange evaluation of a move of the turn player: the material it wins (negative if it loses) once both
+        sides have taken back on the end square with their cheapest piece for as long as it pays. Works on the board as
+        it is, no moves are made. Quiet moves can be checked too, a piece moved to a square where it can be taken for
+        free scores minus its value.
+        # https://www.chessprogramming.org/Static_Exchange_Evaluation
+        """
+        row, col = move.end_row, move.end_col
+
+        # gains[i] is what the i-th capture on the square wins, if the other side stops taking back after it
+        gains = [PIECE_STRENGTH[move.piece_captured[1]] if move.piece_captured is not None else 0]
+        on_square = move.piece_moved[1]
+        if move.pawn_promotion:
+            gains[0] += PIECE_STRENGTH['Q'] - PIECE_STRENGTH['P']
+            on_square = 'Q'
+
+        removed = {(move.start_row, move.start_col)}
+        if move.enpassant_move:
+            removed.add((move.start_row, move.end_col))
+
+        color = BLACK if move.piece_moved[0] == WHITE else WHITE
+        while True:
+            attacker = self.least_valuable_attacker(row, col, color, removed)
+            if attacker is None:
+                break
+            piece_type, attacker_row, attacker_col = attacker
+            other_color = BLACK if color == WHITE else WHITE
+
+            # the king can only take back when nothing is left to take the king with
+            if piece_type == 'K' and \
+                    self.least_valuable_attacker(row, col, other_color, removed | {(attacker_row, attacker_col)}):
+                break
+
+            gains.append(PIECE_STRENGTH[on_square] - gains[-1])
+            on_square = piece_type
+            removed.add((attacker_row, attacker_col))
+            color = other_color
+
+        # either side can stop taking back when it doesn't pay, so work back from the last capture
+        for index in range(len(gains) - 1, 0, -1):
+            gains[index - 1] = -max(-gains[index - 1], gains[index])
+        return gains[0]
+
+    def move_squares(self, move):
+        """
+        Returns the squares the move changes on the board as (row, col, piece after the move), including the enpassant
+        capture and the castling rook
+        """
+        changes = [(move.start_row, move.start_col, None),
+                   (move.end_row, move.end_col, move.piece_moved[0] + 'Q' if move.pawn_promotion else move.piece_moved)]
+        if move.enpassant_move:
+            changes.append((move.start_row, move.end_col, None))
+        elif move.castling_move:
+            rook = move.piece_moved[0] + 'R'
+            if move.end_col - move.start_col == 2:
+                changes += [(move.end_row, move.end_col + 1, None), (move.end_row, move.end_col - 1, rook)]
+            else:
+                changes += [(move.end_row, move.end_col - 2, None), (move.end_row, move.end_col + 1, rook)]
+        return changes
+
+    def gives_check(self, move):
+        """
+        Returns whether the move of the turn player checks the other king, directly or by uncovering a line. Only the
+        squares the move changes are set on the board for the look, not a whole push and pop.
+        """
+        board = self.board
+        changes = self.move_squares(move)
+        saved = [board[change_row][change_col] for change_row, change_col, _piece in changes]
+        for change_row, change_col, piece in changes:
+            board[change_row][change_col] = piece
+
+        color = move.piece_moved[0]
+        king_row, king_col = self.black_king_loc if color == WHITE else self.white_king_loc
+        check = self.is_square_attacked(king_row, king_col, color)
+
+        for (change_row, change_col, _piece), piece in zip(reversed(changes), reversed(saved)):
+            board[change_row][change_col] = piece
+        return check
+
     def all_moves(self):
         """
         Returns a list of all moves to empty space or to capture enemy piece for piece of the turn player
@@ -258,25 +747,17 @@ class ChessEngine:
 
         all_moves = []  # list of Move objects
 
-        # check each board location
-        for row in range(len(self.board)):
-            for col in range(len(self.board[row])):
-                cur_piece = self.board[row][col]
-
-                # there is a piece at the board location (is not None)
-                if cur_piece:
-                    cur_piece_color = cur_piece[0]
-
-                    # if the piece is the same color of the turn player
-                    if (cur_piece_color == WHITE and self.white_turn) or (
-                            cur_piece_color == BLACK and not self.white_turn):
-                        # get all the piece's possible moves according to what piece it is and position
-                        if cur_piece[1] in 'P':
-                            self.pawn_moves(row, col, cur_piece_color, all_moves)
-                        elif cur_piece[1] in 'RBQ':
-                            self.moves_rbq(row, col, cur_piece[1], cur_piece_color, all_moves)
-                        elif cur_piece[1] in 'NK':
-                            self.moves_nk(row, col, cur_piece[1], cur_piece_color, all_moves)
+        # only look at the squares the turn player has pieces on
+        for (row, col), cur_piece in self.piece_locations[WHITE if self.white_turn else BLACK].items():
+            cur_piece_color = cur_piece[0]
+
+            # get all the piece's possible moves according to what piece it is and position
+            if cur_piece[1] in 'P':
+                self.pawn_moves(row, col, cur_piece_color, all_moves)
+            elif cur_piece[1] in 'RBQ':
+                self.moves_rbq(row, col, cur_piece[1], cur_piece_color, all_moves)
+            elif cur_piece[1] in 'NK':
+                self.moves_nk(row, col, cur_piece[1], cur_piece_color, all_moves)
 
         return all_moves
 
@@ -372,38 +853,48 @@ class ChessEngine:
         determines what the castling moves can be made if castling rights are eligible
         """
 
-        # if king is in check then return false
-        if self.is_in_check(color, castling_row=row, castling_col=col, castling=True):
+        # gather the rights for each rook and king
+        if color == WHITE:
+            king_side = self.castling_rights & WHITE_KING_SIDE
+            queen_side = self.castling_rights & WHITE_QUEEN_SIDE
+        else:
+            king_side = self.castling_rights & BLACK_KING_SIDE
+            queen_side = self.castling_rights & BLACK_QUEEN_SIDE
+        if not king_side and not queen_side:
             return
 
-        # gather the rights for each rook and king
-        castle_rights = self.get_castling_rights()
+        # if king is in check then return false
+        enemy_color = BLACK if color == WHITE else WHITE
+        if self.is_square_attacked(row, col, enemy_color):
+            return
 
         # gather the castling moves that are possible for the king
-        if (color == WHITE and castle_rights[0]) or (color == BLACK and castle_rights[1]):
+        if king_side:
             self.king_side_castle(row, col, color, moves_list)
 
         # gather the castling moves that are possible for the queen
-        if (color == WHITE and castle_rights[2]) or (color == BLACK and castle_rights[3]):
+        if queen_side:
             self.queen_side_castle(row, col, color, moves_list)
 
     def king_side_castle(self, row, col, color, moves_list):
         """
         returns the moves for castling of king side
         """
+        enemy_color = BLACK if color == WHITE else WHITE
         if self.is_empty_square(row, col + 1) and self.is_empty_square(row, col + 2):
-            if not self.is_in_check(color, castling_row=row, castling_col=col + 1, castling=True) \
-                    and not self.is_in_check(color, castling_row=row, castling_col=col + 2, castling=True):
+            if not self.is_square_attacked(row, col + 1, enemy_color) \
+                    and not self.is_square_attacked(row, col + 2, enemy_color):
                 moves_list.append(Move((row, col), (row, col + 2), self.board, castle=True))
 
     def queen_side_castle(self, row, col, color, moves_list):
         """
         returns the moves for castling of queen side
         """
+        enemy_color = BLACK if color == WHITE else WHITE
         if self.is_empty_square(row, col - 1) and self.is_empty_square(row, col - 2) and self.is_empty_square(row,
                                                                                                               col - 3):
-            if not self.is_in_check(color, castling_row=row, castling_col=col - 1, castling=True) \
-                    and not self.is_in_check(color, castling_row=row, castling_col=col - 2, castling=True):
+            if not self.is_square_attacked(row, col - 1, enemy_color) \
+                    and not self.is_square_attacked(row, col - 2, enemy_color):
                 moves_list.append(Move((row, col), (row, col - 2), self.board, castle=True))
 
     def get_castling_rights(self):
@@ -411,49 +902,143 @@ class ChessEngine:
         The method gathers rights of the castling capabilities for white king and queens side and black king and
         queen side. It then returns True or False for each of the four eligibility.
         """
+        return [bool(self.castling_rights & WHITE_KING_SIDE), bool(self.castling_rights & BLACK_KING_SIDE),
+                bool(self.castling_rights & WHITE_QUEEN_SIDE), bool(self.castling_rights & BLACK_QUEEN_SIDE)]
 
-        # set all castling rights to True
-        wks, bks, wqs, bqs = True, True, True, True
+    def load_piece_locations(self):
+        """
+        Builds the piece lists from self.board, for setting up a new position
+        """
+        self.piece_locations = {WHITE: {}, BLACK: {}}
+        for row in range(len(self.board)):
+            for col in range(len(self.board[row])):
+                if self.board[row][col] is not None:
+                    self.piece_locations[self.board[row][col][0]][(row, col)] = self.board[row][col]
 
-        for i in range(len(self.move_log)):
+    def load_fen(self, fen):
+        """
+        Sets up the position described by a FEN string, e.g. START_FEN, and clears the move history. The halfmove and
+        fullmove counters are not tracked by the engine and are ignored.
+        """
+        fields = fen.split()
+
+        # piece placement, from the 8th rank down to the 1st
+        self.board = []
+        for row, rank in enumerate(fields[0].split('/')):
+            board_row = []
+            for char in rank:
+                if char.isdigit():
+                    board_row.extend([None] * int(char))
+                else:
+                    piece = (WHITE if char.isupper() else BLACK) + char.upper()
+                    if piece == 'wK':
+                        self.white_king_loc = (row, len(board_row))
+                    elif piece == 'bK':
+                        self.black_king_loc = (row, len(board_row))
+                    board_row.append(piece)
+            if len(board_row) != 8:
+                raise ValueError('Invalid FEN rank: ' + rank)
+            self.board.append(board_row)
+        if len(self.board) != 8:
+            raise ValueError('Invalid FEN: ' + fen)
+
+        self.white_turn = len(fields) < 2 or fields[1] == 'w'
+
+        self.castling_rights = 0
+        if len(fields) > 2:
+            for char, right in FEN_CASTLING:
+                if char in fields[2]:
+                    self.castling_rights |= right
+
+        if len(fields) > 3 and fields[3] != '-':
+            self.enpassant_coords = (8 - int(fields[3][1]), ord(fields[3][0]) - ord('a'))
+        else:
+            self.enpassant_coords = ()
+
+        self.load_piece_locations()
 
-            # if king moved, then both white king side and black side are False
-            if self.move_log[i].piece_moved == 'wK':
-                wks, wqs = False, False
+        # start the logs over from the new position
+        self.move_stack = []
+        self.move_log = []
+        self.pieces_captured = []
+        self.enpassant_log = [self.enpassant_coords]
+        self.castling_log = []
+        self.checkmate = False
+        self.stalemate = False
+        self.position_hash = self.compute_position_key()
+        self.position_hash_log = [self.position_hash]
+        self.material_score, self.positional_score = self.compute_scores()
+        self.score_log = []
+        self.board_state = {}
+        self.move_cache = {}
 
-            # same as above but for black
-            if self.move_log[i].piece_moved == 'bK':
-                bks, bqs = False, False
+    def get_fen(self):
+        """
+        Returns the current position as a FEN string. The halfmove and fullmove counters are not tracked by the engine
+        so they are always written as 0 and 1.
+        """
+        ranks = []
+        for row in self.board:
+            rank = ''
+            empty = 0
+            for piece in row:
+                if piece is None:
+                    empty += 1
+                    continue
+                if empty:
+                    rank += str(empty)
+                    empty = 0
+                rank += piece[1] if piece[0] == WHITE else piece[1].lower()
+            if empty:
+                rank += str(empty)
+            ranks.append(rank)
+
+        castling = ''.join(char for char, right in FEN_CASTLING if self.castling_rights & right) or '-'
+        if self.enpassant_coords:
+            enpassant = chr(ord('a') + self.enpassant_coords[1]) + str(8 - self.enpassant_coords[0])
+        else:
+            enpassant = '-'
 
-            # check if either white rook moved and set the rights accordingly
-            if self.move_log[i].piece_moved == 'wR':
-                if self.move_log[i].start_row == 7 and self.move_log[i].start_col == 0:
-                    wqs = False
-                elif self.move_log[i].start_row == 7 and self.move_log[i].start_col == 7:
-                    wks = False
+        return ' '.join(('/'.join(ranks), 'w' if self.white_turn else 'b', castling, enpassant, '0', '1'))
 
-            # check if either black rook moved and set the rights accordingly
-            if self.move_log[i].piece_moved == 'bR':
-                if self.move_log[i].start_row == 0 and self.move_log[i].start_col == 0:
-                    bqs = False
-                elif self.move_log[i].start_row == 0 and self.move_log[i].start_col == 7:
-                    bks = False
+    def compute_position_key(self):
+        """
+        Computes the zobrist key of the current position from scratch by looking at every square. make_move and
+        undo_move keep self.position_hash up to date without doing this.
+        """
+        key = 0
+        for row in range(len(self.board)):
+            for col in range(len(self.board[row])):
+                if self.board[row][col] is not None:
+                    key ^= PIECE_KEYS[self.board[row][col]][row][col]
 
-            # if white rook was captured at its starting position, then update castling rights accordingly
-            if self.move_log[i].piece_captured == 'wR':
-                if self.move_log[i].end_row == 7 and self.move_log[i].end_col == 0:
-                    wqs = False
-                elif self.move_log[i].end_row == 7 and self.move_log[i].end_col == 7:
-                    wks = False
+        if not self.white_turn:
+            key ^= BLACK_TO_MOVE_KEY
+        if self.enpassant_coords:
+            key ^= ENPASSANT_KEYS[self.enpassant_coords[1]]
+        key ^= CASTLING_KEYS[self.castling_rights]
 
-            # same thing for black
-            if self.move_log[i].piece_captured == 'bR':
-                if self.move_log[i].end_row == 0 and self.move_log[i].end_col == 0:
-                    bqs = False
-                elif self.move_log[i].end_row == 0 and self.move_log[i].end_col == 7:
-                    bks = False
+        return key
 
-        return [wks, bks, wqs, bqs]
+    def compute_scores(self):
+        """
+        Returns the (material, positional) scores of the current position from scratch by looking at every piece.
+        push and pop keep self.material_score and self.positional_score up to date without doing this.
+        """
+        material = 0
+        positional = 0
+        for pieces in self.piece_locations.values():
+            for (row, column), piece in pieces.items():
+                sign = 1 if piece[0] == WHITE else -1
+                material += sign * PIECE_STRENGTH[piece[1]]
+                positional += sign * PIECE_SQUARE_SCORES[piece][row][column]
+        return material, positional
+
+    def position_key(self):
+        """
+        returns the 64 bit zobrist key of the current position (pieces, turn player, castling rights and enpassant)
+        """
+        return self.position_hash
 
     def get_board(self):
         """
@@ -502,7 +1087,13 @@ class ChessEngine:
         """
         returns the move log for human format
         """
-        return self.legible_move_list
+        return [move.get_move_legible() for move in self.move_log]
+
+    def get_chess_notation_log(self):
+        """
+        returns the start and end square of every move in chess notation e.g. 'E2E4'
+        """
+        return [move.get_chess_notation() for move in self.move_log]
 
     def get_captured_pieces(self):
         """
@@ -524,7 +1115,8 @@ class ChessEngine:
 
     def get_material_score(self, hard_mode=False):
         """
-        Gets a material score of the board. The piece scoring is on the constants file.
+        Gets a material score of the board. The piece scoring is on the constants file. The score is kept up to date by
+        push and pop, so this doesn't look at the board.
         # https://www.freecodecamp.org/news/simple-chess-ai-step-by-step-1d55a9266977/
         # https://www.chessprogramming.org/Simplified_Evaluation_Function
         """
@@ -540,21 +1132,149 @@ class ChessEngine:
         elif self.get_status()[1]:
             return STALEMATE
 
-        # start with a score of 0 and get the board
-        score = 0
-        board = self.get_board()
+        # the running totals, hard mode adds the positional scores of the pieces
+        if self.debug_eval:
+            self.check_scores()
+        if hard_mode:
+            return self.material_score + self.positional_score
+        return self.material_score
 
-        # loops through entire board to get a score based on the piece strengths and positional strength of the board
-        for row in range(len(board)):
-            for column in range(len(board[row])):
-                piece = self.get_square(row, column)
-                if piece is not None:
-                    piece_position_score = 0
-                    if piece[1] != KING and hard_mode:
-                        piece_position_score = PIECE_POSITIONAL_SCORE[piece][row][column]
-                    if piece[0] == WHITE:
-                        score += PIECE_STRENGTH[piece[1]] + piece_position_score
-                    else:
-                        score -= PIECE_STRENGTH[piece[1]] + piece_position_score
+    def check_scores(self):
+        """
+        Debug check that the incrementally updated scores match a full scan of the board
+        """
+        material, positional = self.compute_scores()
+        if material != self.material_score or abs(positional - self.positional_score) > 1e-6:
+            raise AssertionError('Incremental scores {} {} do not match the board {} {} after {}'.format(
+                self.material_score, self.positional_score, material, positional, self.get_move_log()))
 
-        return score
+
+def new_engine(backend='board'):
+    """
+    Creates a ChessEngine for a new game. 'board' is the list of lists engine above, 'bitboard' generates moves from
+    bitboards (see bitboard_engine.py). Both expose the same methods so the UI and the AI work with either one.
+    """
+    if backend == 'board':
+        return ChessEngine()
+    if backend == 'bitboard':
+        # imported here since the bitboard engine subclasses ChessEngine
+        from Chess.bitboard_engine import BitboardEngine
+        return BitboardEngine()
+    raise ValueError('Unknown engine backend: ' + str(backend))
+
+
+# checks of the parts of the engine perft doesn't cover
+# usage: python -m Chess.chess_engine check
+
+# positions the FEN round trip check writes and reads back, with every position of their trees to FEN_CHECK_DEPTH
+FEN_CHECK_POSITIONS = [
+    START_FEN,
+    'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1',
+    '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1',
+    'rnbqkbnr/ppp1p1pp/8/3pPp2/8/8/PPPP1PPP/RNBQKBNR w KQkq f6 0 3',
+]
+FEN_CHECK_DEPTH = 2
+
+# how far apart a score kept up to date by push and pop and the same score counted from scratch can be
+SCORE_TOLERANCE = 1e-6
+
+# (FEN, move in chess notation, material the static exchange evaluation of the move wins for the side to move)
+SEE_POSITIONS = [
+    ('1k1r4/1pp4p/p7/4p3/8/P5P1/1PP4P/2K1R3 w - - 0 1', 'E1E5', 1),  # undefended pawn
+    ('1k1r3q/1ppn3p/p4b2/4p3/8/P2N2P1/1PP1R1BP/2K1Q3 w - - 0 1', 'D3E5', -2),  # knight for a pawn
+    ('4k3/8/4p3/3p4/8/8/8/3QK3 w - - 0 1', 'D1D5', -8),  # queen for a defended pawn
+    ('4k3/8/8/3r4/8/8/3R4/3RK3 w - - 0 1', 'D2D5', 5),
+    ('3rk3/8/8/3r4/8/8/3R4/3RK3 w - - 0 1', 'D2D5', 5),  # the rooks behind take back in turn
+    ('4k3/8/8/8/8/8/3q4/3RK3 w - - 0 1', 'E1D2', 9),  # the king takes, nothing can take it back
+    ('4k3/8/8/5p2/8/8/8/3QK3 w - - 0 1', 'D1G4', -9),  # a quiet move to an attacked square
+    ('1r2k3/P7/8/8/8/8/8/4K3 w - - 0 1', 'A7B8', 13),  # capture and promotion
+    ('4k3/2p5/8/3pP3/8/8/8/4K3 w - d6 0 1', 'E5D6', 0),  # enpassant, taken back
+]
+
+
+def check_fen_round_trip():
+    """
+    Returns the problems found writing every position of the FEN_CHECK_POSITIONS trees as a FEN and reading it back
+    on both backends: a different FEN, or a position key, material or positional score that differs from the one
+    kept up to date by push and pop
+    """
+    problems = []
+    for backend in ('board', 'bitboard'):
+        for fen in FEN_CHECK_POSITIONS:
+            engine = new_engine(backend)
+            engine.load_fen(fen)
+            # the engine doesn't keep the move counters, the rest of the FEN comes back as it was
+            if engine.get_fen().split()[:4] != fen.split()[:4]:
+                problems.append('{} ({}): read back as {}'.format(fen, backend, engine.get_fen()))
+
+            def walk(depth):
+                position = engine.get_fen()
+                copy = new_engine(backend)
+                copy.load_fen(position)
+                # the scores are floats added up move by move, so only close to the ones counted from scratch
+                if copy.get_fen() != position or copy.position_key() != engine.position_key() or \
+                        abs(copy.material_score - engine.material_score) > SCORE_TOLERANCE or \
+                        abs(copy.positional_score - engine.positional_score) > SCORE_TOLERANCE:
+                    problems.append('{} ({}) after {}: reads back as a different position'.format(
+                        fen, backend, ' '.join(move.get_chess_notation() for move in engine.move_stack) or 'no moves'))
+                if depth > 0:
+                    for move in engine.legal_moves()[0]:
+                        engine.push(move)
+                        walk(depth - 1)
+                        engine.pop()
+
+            walk(FEN_CHECK_DEPTH)
+    return problems
+
+
+def check_static_exchange():
+    """
+    Returns the problems found comparing static_exchange of the SEE_POSITIONS moves on both backends with their known
+    values
+    """
+    problems = []
+    for backend in ('board', 'bitboard'):
+        engine = new_engine(backend)
+        for fen, notation, expected in SEE_POSITIONS:
+            engine.load_fen(fen)
+            move = next((move for move in engine.valid_moves() if move.get_chess_notation() == notation), None)
+            if move is None:
+                problems.append('{} {}: not a valid move'.format(fen, notation))
+            elif engine.static_exchange(move) != expected:
+                problems.append('{} {} ({}): static exchange {}, expected {}'.format(
+                    fen, notation, backend, engine.static_exchange(move), expected))
+    return problems
+
+
+# (name, function returning a list of the problems it found) of the engine's checks
+CHECKS = (
+    ('FEN round trip', check_fen_round_trip),
+    ('static exchange evaluation', check_static_exchange),
+)
+
+
+def run_checks(checks, out=sys.stdout):
+    """
+    Runs the (name, function) checks, prints whether each passed and the first of its problems. Returns True if
+    nothing was wrong. The other modules' check commands print their results with this too.
+    """
+    all_passed = True
+    for name, check in checks:
+        problems = check()
+        all_passed = all_passed and not problems
+        print('{:<44} {}'.format(name, 'ok' if not problems else 'FAIL'), file=out)
+        for problem in problems[:5]:
+            print('    ' + problem, file=out)
+    return all_passed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Checks of the chess engine (perft checks the move generator)')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('check', help='run the engine checks')
+    parser.parse_args(argv)
+    return 0 if run_checks(CHECKS) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
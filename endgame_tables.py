@@ -0,0 +1,695 @@
+import argparse
+import itertools
+import mmap
+import os
+import random
+import sys
+import time
+
+from Chess.chess_engine import ChessEngine, run_checks
+from Chess.constants import *
+
+# Endgame tables for the AI
+# https://www.chessprogramming.org/Endgame_Tablebases
+# https://www.chessprogramming.org/Retrograde_Analysis
+# A table holds the result of every position of one pawnless ending (e.g. KQvK, a king and queen against a king) with
+# perfect play: win, draw or loss for the side to move and how many plies it takes to checkmate. The tables are built
+# backwards from the checkmates: a position with a move into a lost position is won, a position where every move goes
+# into a won position is lost. Everything left over is a draw.
+# Only the 3 piece endings are built, the generator keeps a byte per position in five arrays of 64^pieces * 2 bytes
+# (2.6MB for 3 pieces), which would be 168MB for a 4 piece ending.
+#
+# usage: python -m Chess.endgame_tables build [KQvK KRvK] [--directory endgame_tables]
+#        python -m Chess.endgame_tables probe --fen "<fen>"
+#        python -m Chess.endgame_tables check [--directory endgame_tables]
+
+# where the tables that ship with the game are
+TABLE_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'endgame_tables')
+TABLE_EXTENSION = '.tbl'
+
+# the tables built by default and shipped, the 3 piece endings that can be won
+DEFAULT_TABLES = ('KQvK', 'KRvK')
+
+# most pieces (kings included) of an ending the generator builds
+MAX_TABLE_PIECES = 3
+
+# results for the side to move
+WIN = 1
+DRAW = 0
+LOSS = -1
+
+# piece types are always listed in this order in table names and in the index
+PIECE_ORDER = 'KQRBN'
+
+# endings where neither side can checkmate
+DRAWN_MATERIAL = ('KvK', 'KBvK', 'KNvK')
+
+# Each position is one byte: 0 is a draw (or a position that can't happen), 1-127 is a win for the side to move with
+# checkmate in 2n-1 plies and 128-255 is a loss with checkmate in 2(n-128) plies (128 is checkmated already).
+LOSS_BYTE = 128
+
+# Without pawns the board can be rotated and mirrored without changing the result, so the tables only store positions
+# with the stronger side's king on one of these 10 squares (a1-d1-d4 triangle) and positions are turned to match.
+TRIANGLE = [(7, 0), (7, 1), (7, 2), (7, 3), (6, 1), (6, 2), (6, 3), (5, 2), (5, 3), (4, 3)]
+TRIANGLE_INDEX = {row * 8 + col: index for index, (row, col) in enumerate(TRIANGLE)}
+
+# positions the check command knows the result of for the side to move, (result, plies to checkmate) or None for no
+# table
+TABLE_POSITIONS = [
+    ('k7/1Q6/1K6/8/8/8/8/8 b - - 0 1', (LOSS, 0)),  # checkmated
+    ('k7/2Q5/8/8/8/8/8/7K b - - 0 1', (DRAW, 0)),  # stalemate
+    ('kQ6/8/1K6/8/8/8/8/8 b - - 0 1', (DRAW, 0)),  # the king takes the queen
+    ('6k1/8/6K1/8/8/8/8/R7 w - - 0 1', (WIN, 1)),  # mate in one
+    ('6K1/8/6k1/8/8/8/8/r7 b - - 0 1', (WIN, 1)),  # the same with the colours swapped
+    ('k7/8/8/8/8/8/8/7K w - - 0 1', (DRAW, 0)),
+    ('4k3/4p3/8/8/8/8/8/4K3 w - - 0 1', None),
+]
+
+# random positions of each table checked against the positions one move on
+TABLE_SAMPLES = 200
+
+
+def _symmetry(flip_row, flip_col, transpose):
+    """
+    Returns a 64 entry table of where each square goes under one of the 8 symmetries of the board
+    """
+    table = []
+    for square in range(64):
+        row, col = divmod(square, 8)
+        if flip_row:
+            row = 7 - row
+        if flip_col:
+            col = 7 - col
+        if transpose:
+            row, col = col, row
+        table.append(row * 8 + col)
+    return table
+
+
+SYMMETRIES = [_symmetry(flip_row, flip_col, transpose)
+              for transpose in (False, True) for flip_row in (False, True) for flip_col in (False, True)]
+
+# the symmetry that takes a king on each square into the triangle
+KING_SYMMETRY = [next(symmetry for symmetry in SYMMETRIES if symmetry[square] in TRIANGLE_INDEX)
+                 for square in range(64)]
+
+
+def _jumps(piece_type):
+    """
+    Returns the squares a king or knight reaches from each square
+    """
+    table = []
+    for square in range(64):
+        row, col = divmod(square, 8)
+        table.append([(row + step[0]) * 8 + col + step[1] for step in MOVE_DIRECTIONS[piece_type]
+                      if 0 <= row + step[0] < 8 and 0 <= col + step[1] < 8])
+    return table
+
+
+def _rays(piece_type):
+    """
+    Returns the rays (squares in order going out from the square) of a rook, bishop or queen for each square
+    """
+    table = []
+    for square in range(64):
+        rays = []
+        for step in MOVE_DIRECTIONS[piece_type]:
+            row, col = divmod(square, 8)
+            ray = []
+            row, col = row + step[0], col + step[1]
+            while 0 <= row < 8 and 0 <= col < 8:
+                ray.append(row * 8 + col)
+                row, col = row + step[0], col + step[1]
+            rays.append(ray)
+        table.append(rays)
+    return table
+
+
+JUMPS = {'K': _jumps('K'), 'N': _jumps('N')}
+JUMP_SETS = {piece_type: [set(squares) for squares in table] for piece_type, table in JUMPS.items()}
+RAYS = {'Q': _rays('Q'), 'R': _rays('R'), 'B': _rays('B')}
+
+# LINES[a][b] is ('R' or 'B', squares in between) when a slider of that kind on a could reach b, else None
+LINES = [[None] * 64 for _square in range(64)]
+for _line_type in ('R', 'B'):
+    for _square in range(64):
+        for _ray in RAYS[_line_type][_square]:
+            for _distance, _target in enumerate(_ray):
+                LINES[_square][_target] = (_line_type, _ray[:_distance])
+
+
+def table_name(white_types, black_types):
+    """
+    Returns the name of the ending with the given piece types of each side, e.g. ('KQ', 'K') -> 'KQvK'
+    """
+    return ''.join(sorted(white_types, key=PIECE_ORDER.index)) + 'v' + \
+        ''.join(sorted(black_types, key=PIECE_ORDER.index))
+
+
+def table_size(name):
+    """
+    Returns the number of bytes of a stored table
+    """
+    return len(TRIANGLE) * 64 ** (len(name) - 2) * 2
+
+
+def is_attacked(target, by_color, pieces, squares, occupied, skip=-1):
+    """
+    Returns whether a piece of by_color attacks the target square. pieces are (color, type) pairs, squares where each
+    one is, occupied the set of occupied squares and skip the index of a piece that was just captured.
+    """
+    for index, (color, piece_type) in enumerate(pieces):
+        if color != by_color or index == skip:
+            continue
+        square = squares[index]
+        if piece_type == 'K' or piece_type == 'N':
+            if target in JUMP_SETS[piece_type][square]:
+                return True
+        else:
+            line = LINES[square][target]
+            if line is not None and (piece_type == 'Q' or piece_type == line[0]):
+                if not any(between in occupied for between in line[1]):
+                    return True
+    return False
+
+
+def decode_byte(value):
+    """
+    Returns (result, plies to checkmate) for the side to move from a table byte
+    """
+    if value == 0:
+        return DRAW, 0
+    if value < LOSS_BYTE:
+        return WIN, 2 * value - 1
+    return LOSS, 2 * (value - LOSS_BYTE)
+
+
+def encode_byte(result, plies):
+    if result == WIN:
+        return (plies + 1) // 2
+    if result == LOSS:
+        return LOSS_BYTE + plies // 2
+    return 0
+
+
+class EndgameTables:
+    """
+    The endgame tables in a directory, memory mapped the first time each one is needed. probe looks up the engine's
+    position, best_move picks the move that wins fastest (or holds the draw, or loses slowest).
+    """
+
+    def __init__(self, directory=TABLE_DIRECTORY):
+        self.directory = directory
+        self.paths = {}
+        if directory is not None and os.path.isdir(directory):
+            for file_name in os.listdir(directory):
+                if file_name.endswith(TABLE_EXTENSION):
+                    self.paths[file_name[:-len(TABLE_EXTENSION)]] = os.path.join(directory, file_name)
+
+        # name: mmap (or bytes of a table that was just built)
+        self.tables = {}
+        self.files = []
+
+        # most pieces of any table, positions with more pieces don't need to be looked up
+        self.max_pieces = max([len(name) - 1 for name in self.paths] or [0])
+
+    def has_table(self, name):
+        return name in self.tables or name in self.paths
+
+    def get_table(self, name):
+        table = self.tables.get(name)
+        if table is None:
+            table_file = open(self.paths[name], 'rb')
+            if os.fstat(table_file.fileno()).st_size != table_size(name):
+                table_file.close()
+                raise ValueError('Wrong size for endgame table ' + self.paths[name])
+            table = mmap.mmap(table_file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.files.append(table_file)
+            self.tables[name] = table
+        return table
+
+    def add_table(self, name, data):
+        """
+        Makes a table that was just built available to probe
+        """
+        self.tables[name] = data
+        self.max_pieces = max(self.max_pieces, len(name) - 1)
+
+    def probe_pieces(self, pieces, white_to_move):
+        """
+        Returns (result, plies to checkmate) for the side to move, pieces being (piece, row, col) like ('wQ', 7, 3).
+        Returns None if there is no table for the pieces.
+        """
+        white_types = [piece[1] for piece, _row, _col in pieces if piece[0] == WHITE]
+        black_types = [piece[1] for piece, _row, _col in pieces if piece[0] == BLACK]
+
+        # there are only tables of endings without pawns
+        if 'P' in white_types or 'P' in black_types:
+            return None
+        name = table_name(white_types, black_types)
+        if name in DRAWN_MATERIAL or table_name(black_types, white_types) in DRAWN_MATERIAL:
+            return DRAW, 0
+
+        # tables are stored with the stronger side as white, for the other way around swap the colors and turn the
+        # board upside down
+        strong_color = WHITE
+        if not self.has_table(name):
+            name = table_name(black_types, white_types)
+            if not self.has_table(name):
+                return None
+            strong_color = BLACK
+            white_to_move = not white_to_move
+
+        # strong side then weak side, each in PIECE_ORDER
+        ordered = sorted(pieces, key=lambda piece: (piece[0][0] != strong_color, PIECE_ORDER.index(piece[0][1])))
+        if strong_color == WHITE:
+            squares = [row * 8 + col for _piece, row, col in ordered]
+        else:
+            squares = [(7 - row) * 8 + col for _piece, row, col in ordered]
+
+        symmetry = KING_SYMMETRY[squares[0]]
+        index = TRIANGLE_INDEX[symmetry[squares[0]]]
+        for square in squares[1:]:
+            index = index * 64 + symmetry[square]
+        index = index * 2 + (0 if white_to_move else 1)
+
+        return decode_byte(self.get_table(name)[index])
+
+    def probe(self, engine):
+        """
+        Returns (result, plies to checkmate) of the engine's position for the side to move, or None if it isn't in a
+        table
+        """
+        pieces = [(piece, row, col) for locations in engine.piece_locations.values()
+                  for (row, col), piece in locations.items()]
+        if len(pieces) > self.max_pieces:
+            return None
+        return self.probe_pieces(pieces, engine.white_turn)
+
+    def best_move(self, engine, moves):
+        """
+        Returns the best of the valid moves by the tables, or None if the position (or a position after one of the
+        moves) isn't in a table
+        """
+        best_move = None
+        best_rank = None
+        for move in moves:
+            engine.push(move)
+            result = self.probe(engine)
+            engine.pop()
+            if result is None:
+                return None
+
+            # the result is for the opponent: mate the fastest when winning, draw if possible, last the longest when
+            # lost
+            opponent_result, plies = result
+            if opponent_result == LOSS:
+                rank = (2, -plies)
+            elif opponent_result == DRAW:
+                rank = (1, 0)
+            else:
+                rank = (0, plies)
+            if best_rank is None or rank > best_rank:
+                best_move = move
+                best_rank = rank
+        return best_move
+
+    def close(self):
+        for table in self.tables.values():
+            if isinstance(table, mmap.mmap):
+                table.close()
+        for table_file in self.files:
+            table_file.close()
+        self.tables = {}
+        self.files = []
+
+
+def open_tables(directory=TABLE_DIRECTORY):
+    """
+    Returns the EndgameTables in directory, or None if there aren't any
+    """
+    tables = EndgameTables(directory)
+    return tables if tables.paths else None
+
+
+def generate_table(name, tables, out=None):
+    """
+    Builds the table for an ending by retrograde analysis and returns it as a bytearray in the stored layout. Tables
+    of the endings reached by a capture have to be in tables (an EndgameTables) already.
+    """
+    strong_types, weak_types = name.split('v')
+    pieces = [(WHITE, piece_type) for piece_type in strong_types] + [(BLACK, piece_type) for piece_type in weak_types]
+    piece_count = len(pieces)
+    kings = {WHITE: 0, BLACK: len(strong_types)}
+    colors = (WHITE, BLACK)  # index is the side to move, 0 for white
+
+    size = 64 ** piece_count * 2
+    values = bytearray(size)
+    state = bytearray(size)  # 0 undecided, 1 decided, 2 can't happen
+    counts = bytearray(size)  # moves not known to lose yet
+    escapes = bytearray(size)  # 1 if a capture draws or wins, so the position can't be lost
+    capture_loss_plies = bytearray(size)  # longest loss through a capture
+
+    # positions decided at each ply count, found by captures into smaller endings before the search gets to them
+    pending = {}
+
+    def index_of(squares, side):
+        index = 0
+        for square in squares:
+            index = index * 64 + square
+        return index * 2 + side
+
+    def piece_moves(index, squares, occupied):
+        """
+        Yields the squares the piece can move to, including onto enemy pieces
+        """
+        piece_type = pieces[index][1]
+        if piece_type == 'K' or piece_type == 'N':
+            for target in JUMPS[piece_type][squares[index]]:
+                yield target
+        else:
+            for ray in RAYS[piece_type][squares[index]]:
+                for target in ray:
+                    yield target
+                    if target in occupied:
+                        break
+
+    start = time.perf_counter()
+    checkmates = []
+
+    # first pass: find the positions that can't happen, count the moves of the rest and look up the captures
+    for squares in itertools.product(range(64), repeat=piece_count):
+        occupied = set(squares)
+        if len(occupied) != piece_count:
+            continue
+        squares = list(squares)
+        for side in (0, 1):
+            index = index_of(squares, side)
+            color = colors[side]
+            enemy = colors[1 - side]
+
+            # the side that just moved can't be in check
+            if is_attacked(squares[kings[enemy]], color, pieces, squares, occupied):
+                state[index] = 2
+                continue
+
+            quiet_moves = 0
+            has_move = False
+            best_capture_win = 0
+            for piece_index in range(piece_count):
+                if pieces[piece_index][0] != color:
+                    continue
+                start_square = squares[piece_index]
+                for target in piece_moves(piece_index, squares, occupied):
+                    captured = -1
+                    if target in occupied:
+                        captured = squares.index(target)
+                        if pieces[captured][0] == color:
+                            continue
+
+                    new_squares = list(squares)
+                    new_squares[piece_index] = target
+                    new_occupied = occupied - {start_square}
+                    new_occupied.add(target)
+                    if is_attacked(new_squares[kings[color]], enemy, pieces, new_squares, new_occupied, captured):
+                        continue
+                    has_move = True
+
+                    if captured == -1:
+                        quiet_moves += 1
+                        continue
+
+                    # the capture goes into a smaller ending, its result is already known
+                    remaining = [(pieces[other][0] + pieces[other][1], *divmod(new_squares[other], 8))
+                                 for other in range(piece_count) if other != captured]
+                    result = tables.probe_pieces(remaining, side == 1)
+                    if result is None:
+                        raise ValueError('Building {} needs the table of {}'.format(name, remaining))
+                    capture_result, plies = result
+                    if capture_result == LOSS:
+                        escapes[index] = 1
+                        if best_capture_win == 0 or plies + 1 < best_capture_win:
+                            best_capture_win = plies + 1
+                    elif capture_result == DRAW:
+                        escapes[index] = 1
+                    else:
+                        capture_loss_plies[index] = max(capture_loss_plies[index], plies + 1)
+
+            if not has_move:
+                state[index] = 1
+                if is_attacked(squares[kings[color]], enemy, pieces, squares, occupied):
+                    values[index] = encode_byte(LOSS, 0)
+                    checkmates.append(index)
+                continue
+
+            counts[index] = quiet_moves
+            if best_capture_win:
+                pending.setdefault(best_capture_win, []).append((index, WIN))
+            elif quiet_moves == 0 and not escapes[index]:
+                # every move is a capture that loses
+                pending.setdefault(capture_loss_plies[index], []).append((index, LOSS))
+
+    if out is not None:
+        print('{}: first pass {:.1f}s'.format(name, time.perf_counter() - start), file=out)
+
+    def unmoves(squares, side):
+        """
+        Yields (predecessor index) for every position the side that isn't to move could have moved from
+        """
+        mover = colors[1 - side]
+        occupied = set(squares)
+        for piece_index in range(piece_count):
+            if pieces[piece_index][0] != mover:
+                continue
+            end_square = squares[piece_index]
+            piece_type = pieces[piece_index][1]
+            if piece_type == 'K' or piece_type == 'N':
+                origins = [origin for origin in JUMPS[piece_type][end_square] if origin not in occupied]
+            else:
+                origins = []
+                for ray in RAYS[piece_type][end_square]:
+                    for origin in ray:
+                        if origin in occupied:
+                            break
+                        origins.append(origin)
+
+            for origin in origins:
+                old_squares = list(squares)
+                old_squares[piece_index] = origin
+                old_occupied = occupied - {end_square}
+                old_occupied.add(origin)
+
+                # the side to move now can't have been in check before the move either
+                if is_attacked(old_squares[kings[colors[side]]], mover, pieces, old_squares, old_occupied):
+                    continue
+                yield index_of(old_squares, 1 - side)
+
+    # second pass: work back from the checkmates one ply at a time
+    plies = 0
+    current = checkmates
+    while current or any(level >= plies for level in pending):
+        for index, result in pending.pop(plies, []):
+            if state[index] == 0:
+                state[index] = 1
+                values[index] = encode_byte(result, plies)
+                current.append(index)
+
+        following = []
+        for index in current:
+            won = values[index] < LOSS_BYTE
+            squares = []
+            position = index >> 1
+            for _piece in range(piece_count):
+                position, square = divmod(position, 64)
+                squares.append(square)
+            squares.reverse()
+
+            for previous in unmoves(squares, index & 1):
+                if state[previous] != 0:
+                    continue
+                if not won:
+                    # a move into a lost position wins
+                    state[previous] = 1
+                    values[previous] = encode_byte(WIN, plies + 1)
+                    following.append(previous)
+                else:
+                    # lost once every move is into a won position
+                    counts[previous] -= 1
+                    if counts[previous] == 0 and not escapes[previous]:
+                        loss_plies = max(plies + 1, capture_loss_plies[previous])
+                        if loss_plies == plies + 1:
+                            state[previous] = 1
+                            values[previous] = encode_byte(LOSS, loss_plies)
+                            following.append(previous)
+                        else:
+                            pending.setdefault(loss_plies, []).append((previous, LOSS))
+
+        plies += 1
+        current = following
+
+    if out is not None:
+        print('{}: longest mate {} plies, {:.1f}s'.format(name, plies - 1, time.perf_counter() - start), file=out)
+
+    # keep only the positions with the strong king in the triangle, the first piece is the most significant digit
+    block = 64 ** (piece_count - 1) * 2
+    stored = bytearray()
+    for row, col in TRIANGLE:
+        square = row * 8 + col
+        stored += values[square * block:(square + 1) * block]
+    return stored
+
+
+def canonical_name(white_types, black_types):
+    """
+    Returns the name the table of an ending is stored under, with the side that has the stronger pieces first
+    """
+    white_strength = sum(PIECE_STRENGTH[piece_type] for piece_type in white_types)
+    black_strength = sum(PIECE_STRENGTH[piece_type] for piece_type in black_types)
+    if (black_strength, len(black_types)) > (white_strength, len(white_types)):
+        return table_name(black_types, white_types)
+    return table_name(white_types, black_types)
+
+
+def required_tables(name):
+    """
+    Returns the tables of the endings reached from an ending by a capture, smallest first, which have to be built
+    before it
+    """
+    strong_types, weak_types = name.split('v')
+    needed = []
+    for types, other_types, captured_first in ((strong_types, weak_types, False), (weak_types, strong_types, True)):
+        for position in range(1, len(types)):
+            smaller = types[:position] + types[position + 1:]
+            if table_name(smaller, other_types) in DRAWN_MATERIAL or \
+                    table_name(other_types, smaller) in DRAWN_MATERIAL:
+                continue
+            sub_name = canonical_name(other_types, smaller) if captured_first else canonical_name(smaller, other_types)
+            for required in required_tables(sub_name) + [sub_name]:
+                if required not in needed:
+                    needed.append(required)
+    return needed
+
+
+def build_tables(names, directory=TABLE_DIRECTORY, out=sys.stdout):
+    """
+    Builds the tables (and the smaller ones they need) that aren't in the directory yet and writes them there
+    """
+    os.makedirs(directory, exist_ok=True)
+    tables = EndgameTables(directory)
+    for name in names:
+        for required in required_tables(name) + [name]:
+            if tables.has_table(required):
+                continue
+            data = generate_table(required, tables, out)
+            with open(os.path.join(directory, required + TABLE_EXTENSION), 'wb') as table_file:
+                table_file.write(data)
+            tables.add_table(required, data)
+    tables.close()
+
+
+def check_table_probes(directory=TABLE_DIRECTORY):
+    """
+    Returns the problems found probing the endgame tables: TABLE_POSITIONS that don't get their known result, and
+    random positions of each table whose result doesn't follow from the results of the positions one move on
+    """
+    tables = open_tables(directory)
+    if tables is None:
+        return []
+    problems = []
+    engine = ChessEngine()
+
+    for fen, expected in TABLE_POSITIONS:
+        engine.load_fen(fen)
+        if tables.probe(engine) != expected:
+            problems.append('{}: probed {}, expected {}'.format(fen, tables.probe(engine), expected))
+
+    generator = random.Random(1)
+    for name in sorted(tables.paths):
+        white_types, black_types = name.split('v')
+        pieces = [WHITE + piece_type for piece_type in white_types] + [BLACK + piece_type for piece_type in black_types]
+        checked = 0
+        while checked < TABLE_SAMPLES:
+            squares = generator.sample(range(64), len(pieces))
+            # empty squares as 1s, load_fen adds up the digits
+            board = [['1'] * 8 for _row in range(8)]
+            for piece, square in zip(pieces, squares):
+                board[square // 8][square % 8] = piece[1] if piece[0] == WHITE else piece[1].lower()
+            fen = '/'.join(''.join(row) for row in board) + (' w' if generator.random() < 0.5 else ' b') + ' - - 0 1'
+            engine.load_fen(fen)
+
+            # the side that just moved can't be left in check
+            to_move = WHITE if engine.white_turn else BLACK
+            if engine.is_in_check(BLACK if to_move == WHITE else WHITE):
+                continue
+            checked += 1
+
+            # what the position should be from the positions after each move
+            children = []
+            for move in engine.legal_moves()[0]:
+                engine.push(move)
+                children.append(tables.probe(engine))
+                engine.pop()
+            if not children:
+                expected = (LOSS, 0) if engine.is_in_check(to_move) else (DRAW, 0)
+            elif any(result == LOSS for result, _plies in children):
+                expected = (WIN, 1 + min(plies for result, plies in children if result == LOSS))
+            elif any(result == DRAW for result, _plies in children):
+                expected = (DRAW, 0)
+            else:
+                expected = (LOSS, 1 + max(plies for _result, plies in children))
+
+            result = tables.probe(engine)
+            if result != expected:
+                problems.append('{}: probed {}, the moves from it say {}'.format(engine.get_fen(), result, expected))
+    tables.close()
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Builds and probes the endgame tables')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = commands.add_parser('build', help='build tables by retrograde analysis')
+    build_parser.add_argument('names', nargs='*', default=list(DEFAULT_TABLES),
+                              help='endings to build, e.g. KQvK KRvK')
+    build_parser.add_argument('--directory', default=TABLE_DIRECTORY)
+
+    probe_parser = commands.add_parser('probe', help='look up a position and its best move')
+    probe_parser.add_argument('--fen', required=True)
+    probe_parser.add_argument('--directory', default=TABLE_DIRECTORY)
+
+    check_parser = commands.add_parser('check', help='check the tables against known results and their own moves')
+    check_parser.add_argument('--directory', default=TABLE_DIRECTORY)
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'check':
+        return 0 if run_checks([('endgame table probes', lambda: check_table_probes(args.directory))]) else 1
+
+    if args.command == 'build':
+        names = []
+        for name in args.names:
+            white_types, black_types = name.upper().split('V')
+            if len(white_types) + len(black_types) > MAX_TABLE_PIECES:
+                parser.error('{} has more than {} pieces'.format(name, MAX_TABLE_PIECES))
+            names.append(canonical_name(white_types, black_types))
+        build_tables(names, args.directory)
+        return 0
+
+    tables = EndgameTables(args.directory)
+    engine = ChessEngine()
+    engine.load_fen(args.fen)
+    result = tables.probe(engine)
+    if result is None:
+        print('not in the tables')
+        return 1
+    print({WIN: 'win', DRAW: 'draw', LOSS: 'loss'}[result[0]], 'in', result[1], 'plies')
+    best_move = tables.best_move(engine, engine.valid_moves())
+    if best_move is not None:
+        print('best move', best_move.get_chess_notation())
+    tables.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,3 +1,6 @@
+import queue
+import sys
+import threading
 import pygame
 import traceback
 
@@ -5,11 +8,24 @@ from .constants import *
 from .board import Board
 
 from Chess.chess_engine import ChessEngine
-from Chess.move import Move
 from Chess.ai import ChessAI
 
 from .client_network import Network
 
+# seconds the hard AI gets to think per move, it searches deeper the more time it has
+HARD_AI_TIME_LIMIT = 2.0
+
+# processes the hard AI splits its search between. The root split is experimental, it stays at one until
+# parallel_benchmark shows it faster than a single process on a multi-core machine (on one core it is slower)
+HARD_AI_WORKERS = 1
+
+# whether the hard AI searches on the player's time, on the move it expects them to play
+HARD_AI_PONDER = True
+
+# how often (seconds) python switches between the drawing thread and the AI thread, the default 5ms lets a frame
+# wait too long behind the search
+AI_THREAD_SWITCH_INTERVAL = 0.001
+
 
 def get_player_color(data):
     """
@@ -36,6 +52,96 @@ def is_turn(color, engine: ChessEngine):
     return False
 
 
+def find_valid_move(valid_moves, start_square, end_square):
+    """
+    Returns the move in valid_moves going from start_square to end_square, or None if there isn't one.
+    """
+    for move in valid_moves:
+        if (move.start_row, move.start_col) == start_square and (move.end_row, move.end_col) == end_square:
+            return move
+    return None
+
+
+def start_ai_search(ai: ChessAI, engine: ChessEngine, difficulty, ponder_move=None):
+    """
+    Starts the AI looking for its move on a background thread so the window keeps drawing and handling events.
+    The AI gets its own copy of the position, the live engine isn't touched. With a ponder_move (the player's move
+    the AI expects) the copy plays it and the AI ponders: it searches the position after it without a time limit
+    until ai.ponder_hit or the search is cancelled. Returns the thread, the queue the chosen move will be put on and
+    the event that cancels the search when set.
+    """
+    search_engine = ChessEngine()
+    search_engine.load_fen(engine.get_fen())
+    search_engine.board_state = dict(engine.board_state)  # for threefold repetition
+    if ponder_move is not None:
+        ponder_moves = search_engine.valid_moves()
+        search_engine.make_move(ponder_moves[ponder_moves.index(ponder_move)])
+
+    result_queue = queue.Queue()
+    cancel_event = threading.Event()
+    ai.cancel_event = cancel_event
+    ai.ponder_hit_received = False
+    thread = threading.Thread(target=run_ai_search, args=(ai, search_engine, difficulty, result_queue, cancel_event,
+                                                          ponder_move is not None), daemon=True)
+    thread.start()
+    return thread, result_queue, cancel_event
+
+
+def run_ai_search(ai: ChessAI, engine: ChessEngine, difficulty, result_queue, cancel_event, ponder=False):
+    """
+    Runs on the AI thread, puts the AI's move and the reply it expects (None below hard) on the result queue unless
+    the search was cancelled
+    """
+    valid_moves = engine.valid_moves()
+    expected_reply = None
+    if difficulty == EAS_DIFF:
+        ai_move = ai.random_ai(valid_moves)
+    elif difficulty == MED_DIFF:
+        ai_move = ai.greedy_ai(valid_moves, engine)
+    else:
+        ai_move = ai.negamax_alphabeta_ai(valid_moves, engine, ponder=ponder)
+        if HARD_AI_PONDER:
+            expected_reply = ai.expected_reply(engine, ai_move)
+
+    if not cancel_event.is_set():
+        result_queue.put((ai_move, expected_reply))
+
+
+def start_pondering(ai: ChessAI, engine: ChessEngine, difficulty, ponder_move):
+    """
+    Starts the AI pondering on the player's expected move, if it leaves the player a move to make and the game isn't
+    over. Returns the search like start_ai_search, or None when there's nothing to ponder.
+    """
+    if ponder_move is None or is_game_over(engine):
+        return None
+
+    # the expected move can't be the end of the game or there is nothing for the AI to search
+    engine.push(ponder_move)
+    game_continues = len(engine.valid_moves()) > 0 and not engine.get_status()[1]
+    engine.pop()
+    if not game_continues:
+        return None
+    return start_ai_search(ai, engine, difficulty, ponder_move)
+
+
+def cancel_ai_search(ai_search):
+    """
+    Cancels the AI's search if one is running and waits for the thread to finish
+    """
+    if ai_search is not None:
+        thread, _result_queue, cancel_event = ai_search
+        cancel_event.set()
+        thread.join()
+
+
+def stop_ai_search(ai: ChessAI, ai_search):
+    """
+    Cancels the AI's search if one is running, waits for the thread to finish and stops the AI's worker processes
+    """
+    cancel_ai_search(ai_search)
+    ai.close()
+
+
 def init_connect(network):
     """
     Returns a string of the player color. Returns None if connection error.
@@ -263,7 +369,9 @@ def play_singleplayer(clock, difficulty):
     player_color = WHITE  # do we want to implement a color selection? (display after select difficult in draw_sel_menu)
     engine = ChessEngine()
     board = Board(player_color)
-    ai = ChessAI()
+    ai = ChessAI(time_limit=HARD_AI_TIME_LIMIT, workers=HARD_AI_WORKERS)
+    ai_search = None  # (thread, result queue, cancel event) while the AI is thinking
+    ponder_move = None  # the player's move the AI expects while it is pondering on it
 
     display_popup = False
     popup_text = None
@@ -301,6 +409,7 @@ def play_singleplayer(clock, difficulty):
             if event.type == pygame.QUIT:
                 global run
                 run = False
+                stop_ai_search(ai, ai_search)
                 return
 
             if event.type == pygame.MOUSEBUTTONDOWN:
@@ -314,24 +423,24 @@ def play_singleplayer(clock, difficulty):
                     if event.type == pygame.MOUSEBUTTONDOWN:
                         # second click: placing a selected piece on the board
                         if board.piece_chosen:
-                            move = Move(board.piece_chosen, mouse_square, engine.board)
+                            # the valid move between the two squares carries the enpassant/castle flags
+                            move = find_valid_move(valid_moves, board.piece_chosen, mouse_square)
 
                             # make a move if it is a valid move and set move_made to true
-                            if move in valid_moves:
-                                if move.piece_moved[1] == 'P' and abs(move.start_col - move.end_col) == 1 \
-                                        and move.piece_captured is None:
-                                    move = Move(board.piece_chosen, mouse_square, engine.board, castle=False,
-                                                enpassant=True)
-                                elif move.piece_moved[1] == 'K' and abs(move.start_col - move.end_col) == 2:
-                                    move = Move(board.piece_chosen, mouse_square, engine.board, castle=True,
-                                                enpassant=False)
-                                else:
-                                    move = Move(board.piece_chosen, mouse_square, engine.board, castle=False,
-                                                enpassant=False)
-
+                            if move is not None:
                                 engine.make_move(move)
                                 move_made = True
 
+                                # the AI has been searching the position after the move it expected, keep the
+                                # search going as its real one if the player made that move, throw it away if not
+                                if ponder_move is not None:
+                                    if move == ponder_move:
+                                        ai.ponder_hit()
+                                    else:
+                                        cancel_ai_search(ai_search)
+                                        ai_search = None
+                                    ponder_move = None
+
                                 # store Move object into data buffer to send to server
                                 global make_move
                                 make_move = move
@@ -343,17 +452,6 @@ def play_singleplayer(clock, difficulty):
                             # Won't allow a user to click on empty square
                             if not engine.is_empty_square(row, col):
                                 board.piece_chosen = mouse_square
-                # AI executes turn
-                else:
-                    # AI makes a move
-                    if difficulty == EAS_DIFF:
-                        ai_move = ai.random_ai(valid_moves)
-                    elif difficulty == MED_DIFF:
-                        ai_move = ai.greedy_ai(valid_moves, engine)
-                    else:
-                        ai_move = ai.negamax_alphabeta_ai(valid_moves, engine)
-                    engine.make_move(ai_move)
-                    move_made = True
 
                 # get the next set of valid moves and reset move_made
                 if move_made:
@@ -366,6 +464,31 @@ def play_singleplayer(clock, difficulty):
                     if popup_win.collidepoint(pygame.mouse.get_pos()):
                         game_state = SEL_MENU
 
+        # AI executes turn, it thinks on its own thread and the move is picked up on a later frame
+        if game_state == SINGLE_PLAY and not is_game_over(engine) and not is_turn(player_color, engine):
+            if ai_search is None:
+                ai_search = start_ai_search(ai, engine, difficulty)
+            else:
+                try:
+                    ai_move, expected_reply = ai_search[1].get_nowait()
+                except queue.Empty:
+                    ai_move = None
+
+                # the AI's move was found on its copy of the position, make the same move on the live engine
+                if ai_move is not None:
+                    ai_search = None
+                    engine.make_move(valid_moves[valid_moves.index(ai_move)])
+                    valid_moves = engine.valid_moves()
+
+                    # think about the reply to the player's expected move while they think about theirs
+                    if difficulty == HAR_DIFF and HARD_AI_PONDER:
+                        ai_search = start_pondering(ai, engine, difficulty, expected_reply)
+                        if ai_search is not None:
+                            ponder_move = expected_reply
+
+    # stop the AI when going back to the menu
+    stop_ai_search(ai, ai_search)
+
 
 def play_multiplayer(clock):
     """
@@ -444,21 +567,11 @@ def play_multiplayer(clock):
                             if event.type == pygame.MOUSEBUTTONDOWN:
                                 # second click: placing a selected piece on the board
                                 if board.piece_chosen:
-                                    move = Move(board.piece_chosen, mouse_square, engine.board)
+                                    # the valid move between the two squares carries the enpassant/castle flags
+                                    move = find_valid_move(valid_moves, board.piece_chosen, mouse_square)
 
                                     # make a move if it is a valid move and set move_made to true
-                                    if move in valid_moves:
-                                        if move.piece_moved[1] == 'P' and abs(move.start_col - move.end_col) == 1 \
-                                                and move.piece_captured is None:
-                                            move = Move(board.piece_chosen, mouse_square, engine.board, castle=False,
-                                                        enpassant=True)
-                                        elif move.piece_moved[1] == 'K' and abs(move.start_col - move.end_col) == 2:
-                                            move = Move(board.piece_chosen, mouse_square, engine.board, castle=True,
-                                                        enpassant=False)
-                                        else:
-                                            move = Move(board.piece_chosen, mouse_square, engine.board, castle=False,
-                                                        enpassant=False)
-
+                                    if move is not None:
                                         engine.make_move(move)
                                         move_made = True
 
@@ -517,6 +630,9 @@ ai_difficulty = None
 
 
 def main():
+    # the switch interval is for the whole interpreter, it is set once here instead of around every search so the
+    # ponder and search threads never put back each other's value
+    sys.setswitchinterval(AI_THREAD_SWITCH_INTERVAL)
     clock = pygame.time.Clock()
     pygame.init()  # create the game window
 
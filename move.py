@@ -1,12 +1,24 @@
 from .constants import *
 
 
+# flag bits of the packed move encoding
+PROMOTION_FLAG = 1
+ENPASSANT_FLAG = 2
+CASTLE_FLAG = 4
+
+
 class Move:
     """
     The init takes the first clicked square and second clicked square and stores the starting and ending coords.
     It then stores the piece that moved and piece that was captured based on that starting and ending coords.
+    The move is also packed into a single int, move_id: start square in bits 0-5, end square in bits 6-11 and the
+    promotion/enpassant/castle flags above that. Pawns always promote to a queen so no promotion piece is stored.
     """
 
+    # moves are created by the thousand in valid_moves and the AI search, so don't give each one a __dict__
+    __slots__ = ('start_row', 'start_col', 'end_row', 'end_col', 'piece_moved', 'piece_captured', 'pawn_promotion',
+                 'enpassant_move', 'castling_move', 'move_id')
+
     def __init__(self, startSq, endSq, board, enpassant=False, castle=False):
         self.start_row = startSq[0]
         self.start_col = startSq[1]
@@ -19,8 +31,16 @@ class Move:
         self.castling_move = castle  # set a castling move was made
         if enpassant:
             self.piece_captured = self.is_enpassant_capture()  # update piece captured for enpassant
-        # creates a unique id like a hash function
-        self.move_id = self.start_row * 1000 + self.start_col * 100 + self.end_row * 10 + self.end_col
+
+        # packs the squares and flags into a unique id like a hash function
+        flags = 0
+        if self.pawn_promotion:
+            flags |= PROMOTION_FLAG
+        if enpassant:
+            flags |= ENPASSANT_FLAG
+        if castle:
+            flags |= CASTLE_FLAG
+        self.move_id = (self.start_row * 8 + self.start_col) | (self.end_row * 8 + self.end_col) << 6 | flags << 12
 
     def __eq__(self, other):
         """
@@ -30,6 +50,12 @@ class Move:
             return self.move_id == other.move_id
         return False
 
+    def __hash__(self):
+        """
+        moves hash by their packed encoding so they can be used in sets and as dictionary keys
+        """
+        return self.move_id
+
     def get_chess_notation(self):
         """
         Returns a string of a move's start and end square in chess notation e.g. 'E2 E4'
@@ -44,8 +70,8 @@ class Move:
         """
         Returns a human legible move to be used when logging the move in the UI
         """
-        # ID: piece Moves From chess n to square
-        string = str(self.move_id) + ': '
+        # ID: piece Moves From chess n to square, the ID is the start and end row/col digits and not the packed move_id
+        string = str(self.start_row * 1000 + self.start_col * 100 + self.end_row * 10 + self.end_col) + ': '
         string += PIECES[self.piece_moved]
         string += ' Moves From '
         string += COL_TO_NOTATION[self.start_col] + ROW_TO_NOTATION[self.start_row]
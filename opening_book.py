@@ -0,0 +1,329 @@
+import argparse
+import mmap
+import os
+import random
+import re
+import struct
+import sys
+import tempfile
+
+from Chess.chess_engine import ChessEngine, run_checks
+
+# Opening book for the AI
+# https://www.chessprogramming.org/Opening_Book
+# The book is a binary file of fixed size records (position key, move, weight) sorted by position key. It is memory
+# mapped and looked up with a binary search, so only the few pages around the position are ever read from disk. The
+# position keys are the engine's zobrist keys, which use a fixed seed so they are the same in every run.
+#
+# usage: python -m Chess.opening_book build [games.pgn games.txt ...] [-o opening_book.bin] [--plies 16]
+#        python -m Chess.opening_book probe [--book opening_book.bin] [--fen "<fen>"]
+#        python -m Chess.opening_book check [--book opening_book.bin] [--source opening_book.txt]
+
+# position key, move_id, weight (big-endian so the file is the same on every machine)
+RECORD_FORMAT = '>QHH'
+RECORD_SIZE = struct.calcsize(RECORD_FORMAT)
+
+# the book that ships with the game and the openings it is built from
+BOOK_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'opening_book.bin')
+BOOK_SOURCE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'opening_book.txt')
+
+# how many moves (of both players) into each game go into the book
+BOOK_PLIES = 16
+
+MAX_WEIGHT = 0xFFFF
+
+# a move in the engine's coordinate notation e.g. e2e4 or E2E4, promotion piece allowed (always a queen anyway)
+COORDINATE_MOVE = re.compile(r'^([a-h][1-8])([a-h][1-8])[qrbn]?$', re.IGNORECASE)
+
+# SAN move e.g. Nbd7, exd5, e8=Q+
+SAN_MOVE = re.compile(r'^([NBRQK])?([a-h])?([1-8])?x?([a-h][1-8])(=?[NBRQ])?$')
+
+
+class OpeningBook:
+    """
+    Read only view of a book file. probe returns the book moves of a position, choose_move picks one of them for the
+    AI weighted by how often it was played.
+    """
+
+    def __init__(self, path=BOOK_PATH):
+        self.path = path
+        self.file = open(path, 'rb')
+        size = os.fstat(self.file.fileno()).st_size
+        if size % RECORD_SIZE != 0:
+            self.file.close()
+            raise ValueError('Not an opening book file: ' + path)
+
+        # mmap can't map an empty file
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+        self.record_count = size // RECORD_SIZE
+
+    def key_at(self, index):
+        return struct.unpack_from('>Q', self.data, index * RECORD_SIZE)[0]
+
+    def probe(self, key):
+        """
+        Returns a list of (move_id, weight) for the position key, empty if the position isn't in the book
+        """
+        # binary search for the first record of the key
+        low, high = 0, self.record_count
+        while low < high:
+            middle = (low + high) // 2
+            if self.key_at(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+
+        entries = []
+        for index in range(low, self.record_count):
+            record_key, move_id, weight = struct.unpack_from(RECORD_FORMAT, self.data, index * RECORD_SIZE)
+            if record_key != key:
+                break
+            entries.append((move_id, weight))
+        return entries
+
+    def choose_move(self, engine, moves):
+        """
+        Returns one of the valid moves that the book has for the engine's position, picked at random weighted by the
+        book, or None when the position is out of book
+        """
+        moves_by_id = {move.move_id: move for move in moves}
+        book_moves = []
+        weights = []
+        for move_id, weight in self.probe(engine.position_key()):
+            # a key collision could point at a move that isn't legal here
+            if move_id in moves_by_id and weight > 0:
+                book_moves.append(moves_by_id[move_id])
+                weights.append(weight)
+
+        if not book_moves:
+            return None
+        return random.choices(book_moves, weights)[0]
+
+    def close(self):
+        if self.record_count:
+            self.data.close()
+        self.file.close()
+
+
+def open_book(path=BOOK_PATH):
+    """
+    Returns the OpeningBook at path, or None if there is no book file
+    """
+    if path is None or not os.path.exists(path):
+        return None
+    return OpeningBook(path)
+
+
+def parse_move(engine, text):
+    """
+    Returns the valid move of the engine's position written as text, in coordinate notation (e2e4) or SAN (Nf3, exd5,
+    O-O, e8=Q+). Raises ValueError if it isn't a valid move.
+    """
+    moves = engine.valid_moves()
+    token = text.rstrip('+#!?')
+
+    coordinate_match = COORDINATE_MOVE.match(token)
+    if coordinate_match:
+        start, end = coordinate_match.group(1).lower(), coordinate_match.group(2).lower()
+        for move in moves:
+            if notation_square(move.start_row, move.start_col) == start and \
+                    notation_square(move.end_row, move.end_col) == end:
+                return move
+        raise ValueError('Not a valid move: ' + text)
+
+    # castling, the king moves two squares
+    if token in ('O-O', '0-0', 'O-O-O', '0-0-0'):
+        king_side = token in ('O-O', '0-0')
+        for move in moves:
+            if move.castling_move and (move.end_col > move.start_col) == king_side:
+                return move
+        raise ValueError('Not a valid move: ' + text)
+
+    san_match = SAN_MOVE.match(token)
+    if san_match is None:
+        raise ValueError('Not a move: ' + text)
+    piece_type, from_file, from_rank, end, _promotion = san_match.groups()
+    piece_type = piece_type or 'P'
+
+    candidates = []
+    for move in moves:
+        if move.piece_moved[1] != piece_type or notation_square(move.end_row, move.end_col) != end:
+            continue
+        start = notation_square(move.start_row, move.start_col)
+        if (from_file and start[0] != from_file) or (from_rank and start[1] != from_rank):
+            continue
+        candidates.append(move)
+    if len(candidates) != 1:
+        raise ValueError(('Ambiguous move: ' if candidates else 'Not a valid move: ') + text)
+    return candidates[0]
+
+
+def notation_square(row, col):
+    """
+    Returns a square in lowercase chess notation e.g. 'e4'
+    """
+    return 'abcdefgh'[col] + str(8 - row)
+
+
+def read_games(text):
+    """
+    Returns the games in a PGN file or a move list file (one game per line) as lists of move strings. Tags, comments,
+    variations, move numbers, NAGs and results are skipped.
+    """
+    # comments and variations can span lines so take them out first
+    text = re.sub(r'\{[^}]*\}', ' ', text)
+    while re.search(r'\([^()]*\)', text):
+        text = re.sub(r'\([^()]*\)', ' ', text)
+
+    pgn = is_pgn_text(text)
+    games = []
+    current = []
+    for line in text.splitlines():
+        line = line.split(';')[0].strip()
+        if line.startswith('#'):
+            continue
+
+        # a tag line or a blank line after moves ends a PGN game, in a move list every line is a game
+        if line.startswith('[') or not line:
+            if current:
+                games.append(current)
+                current = []
+            continue
+
+        for token in line.split():
+            token = re.sub(r'^\d+\.+', '', token)
+            if not token or token.startswith('$') or token in ('1-0', '0-1', '1/2-1/2', '*'):
+                continue
+            current.append(token)
+
+        if not pgn:
+            games.append(current)
+            current = []
+
+    if current:
+        games.append(current)
+    return games
+
+
+def is_pgn_text(text):
+    """
+    PGN files start their games with tag pairs like [Event "..."]
+    """
+    return re.search(r'^\s*\[\w+\s+"', text, re.MULTILINE) is not None
+
+
+def build_book(games, path, plies=BOOK_PLIES):
+    """
+    Plays the first plies moves of every game and writes the book of (position key, move, times played) records to
+    path. Returns the number of records written.
+    """
+    counts = {}
+    for game in games:
+        engine = ChessEngine()
+        for text in game[:plies]:
+            move = parse_move(engine, text)
+            key = (engine.position_key(), move.move_id)
+            counts[key] = counts.get(key, 0) + 1
+            engine.make_move(move)
+
+    with open(path, 'wb') as book_file:
+        for (key, move_id), count in sorted(counts.items()):
+            book_file.write(struct.pack(RECORD_FORMAT, key, move_id, min(count, MAX_WEIGHT)))
+    return len(counts)
+
+
+def check_book_lookup(path=BOOK_PATH, source_path=BOOK_SOURCE_PATH):
+    """
+    Returns the problems found probing a small book built from known games, and probing the book at path with the
+    games of source_path it was built from
+    """
+    problems = []
+
+    # e4 is played twice from the start and d4 once, after e4 e5 and c5 once each
+    games = [['e4', 'e5', 'Nf3'], ['e4', 'c5'], ['d4', 'd5']]
+    expected = {(): {'e2e4': 2, 'd2d4': 1}, ('e4',): {'e7e5': 1, 'c7c5': 1}, ('e4', 'e5'): {'g1f3': 1},
+                ('e4', 'e5', 'Nf3'): {}, ('e3',): {}}
+    handle, check_path = tempfile.mkstemp(suffix='.bin')
+    os.close(handle)
+    try:
+        build_book(games, check_path)
+        book = OpeningBook(check_path)
+        for moves, expected_moves in expected.items():
+            engine = ChessEngine()
+            for text in moves:
+                engine.make_move(parse_move(engine, text))
+            found = {}
+            for move_id, weight in book.probe(engine.position_key()):
+                move = next(move for move in engine.valid_moves() if move.move_id == move_id)
+                found[move.get_chess_notation().lower()] = weight
+            if found != expected_moves:
+                problems.append('after {}: book has {}, expected {}'.format(' '.join(moves) or 'no moves', found,
+                                                                          expected_moves))
+        book.close()
+    finally:
+        os.remove(check_path)
+
+    # every move of the book's own games is in the book, and the book only picks valid moves
+    book = open_book(path)
+    if book is not None and os.path.exists(source_path):
+        with open(source_path) as source_file:
+            source_games = read_games(source_file.read())
+        for game in source_games:
+            engine = ChessEngine()
+            for text in game[:BOOK_PLIES]:
+                move = parse_move(engine, text)
+                if move.move_id not in dict(book.probe(engine.position_key())):
+                    problems.append('{}: {} is missing from the book'.format(engine.get_fen(), text))
+                if book.choose_move(engine, engine.valid_moves()) not in engine.valid_moves():
+                    problems.append('{}: the book chose a move that isn\'t valid'.format(engine.get_fen()))
+                engine.make_move(move)
+        book.close()
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Builds and probes the opening book')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = commands.add_parser('build', help='compile PGN or move list files into a book')
+    build_parser.add_argument('inputs', nargs='*', default=[BOOK_SOURCE_PATH],
+                              help='PGN files or text files with one game per line, opening_book.txt by default')
+    build_parser.add_argument('-o', '--output', default=BOOK_PATH)
+    build_parser.add_argument('--plies', type=int, default=BOOK_PLIES, help='moves of each game to add to the book')
+
+    probe_parser = commands.add_parser('probe', help='list the book moves of a position')
+    probe_parser.add_argument('--book', default=BOOK_PATH)
+    probe_parser.add_argument('--fen', help='position to look up, the starting position by default')
+
+    check_parser = commands.add_parser('check', help='check the lookups of a book built from known games and a book')
+    check_parser.add_argument('--book', default=BOOK_PATH)
+    check_parser.add_argument('--source', default=BOOK_SOURCE_PATH, help='the games the book was built from')
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'check':
+        return 0 if run_checks([('opening book lookup', lambda: check_book_lookup(args.book, args.source))]) else 1
+
+    if args.command == 'build':
+        games = []
+        for input_path in args.inputs:
+            with open(input_path) as input_file:
+                games.extend(read_games(input_file.read()))
+        records = build_book(games, args.output, args.plies)
+        print('{} games, {} book entries written to {}'.format(len(games), records, args.output))
+        return 0
+
+    book = OpeningBook(args.book)
+    engine = ChessEngine()
+    if args.fen:
+        engine.load_fen(args.fen)
+    moves_by_id = {move.move_id: move for move in engine.valid_moves()}
+    for move_id, weight in book.probe(engine.position_key()):
+        move = moves_by_id.get(move_id)
+        print(move.get_chess_notation() if move else '? ({})'.format(move_id), weight)
+    book.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,72 @@
+import argparse
+import os
+import sys
+import time
+
+from Chess.ai import ChessAI
+from Chess.chess_engine import ChessEngine
+from Chess.search_benchmark import POSITIONS
+
+# Benchmark of the parallel root split search of ChessAI (workers > 1) against the single process search
+# Every worker count searches each position of search_benchmark to the same depth and the wall clock time is compared
+# with one worker's. The parallel search is experimental: on the one core machine it was written on it is slower than
+# a single process, since the workers only share the CPU and each has its own transposition table. This is what to run
+# on a multi-core machine before turning it on (HARD_AI_WORKERS in the frontend).
+# https://www.chessprogramming.org/Parallel_Search
+#
+# usage: python -m Chess.parallel_benchmark [--depth 4] [--workers 1,2,4,8,16]
+
+
+def run_workers(workers, depth):
+    """
+    Searches every position with a ChessAI splitting its search between the workers. Returns (seconds, nodes, moves
+    found) over the positions, the seconds don't include starting the worker processes.
+    """
+    ai = ChessAI(depth=depth, workers=workers, book_path=None, table_directory=None)
+
+    # start the worker processes with a search that isn't timed
+    engine = ChessEngine()
+    engine.load_fen(POSITIONS[0][1])
+    ai.negamax_alphabeta_ai(engine.valid_moves(), engine)
+
+    seconds = 0.0
+    nodes = 0
+    moves = []
+    for _name, fen, _best_moves in POSITIONS:
+        engine = ChessEngine()
+        engine.load_fen(fen)
+
+        # every position starts with an empty table, like a new ChessAI (the workers keep theirs)
+        ai.transposition_table.clear()
+        start = time.perf_counter()
+        move, stats = ai.negamax_alphabeta_ai(engine.valid_moves(), engine, return_stats=True)
+        seconds += time.perf_counter() - start
+        nodes += stats.nodes + stats.qnodes
+        moves.append(move.move_id)
+    ai.close()
+    return seconds, nodes, moves
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compares the parallel search with the single process search')
+    parser.add_argument('--depth', type=int, default=4, help='depth searched in every position')
+    parser.add_argument('--workers', default='1,2,4,8,16', help='comma separated worker counts to run')
+    args = parser.parse_args(argv)
+
+    print('{} positions, depth {}, {} cpus'.format(len(POSITIONS), args.depth, os.cpu_count()))
+    print('{:>8} {:>10} {:>10} {:>9} {:>12}'.format('workers', 'seconds', 'speedup', 'nodes', 'same moves'))
+
+    # times and moves are compared with the first worker count run, 1 by default
+    baseline = None
+    for workers in map(int, args.workers.split(',')):
+        seconds, nodes, moves = run_workers(workers, args.depth)
+        if baseline is None:
+            baseline = (seconds, moves)
+        same = sum(move == baseline_move for move, baseline_move in zip(moves, baseline[1]))
+        print('{:>8} {:>10.2f} {:>9.2f}x {:>9} {:>9}/{:<2}'.format(
+            workers, seconds, baseline[0] / seconds if seconds else 0, nodes, same, len(POSITIONS)))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,195 @@
+import argparse
+import sys
+import time
+
+from Chess.chess_engine import new_engine, run_checks, START_FEN
+from Chess.constants import *
+
+# Perft (performance test) counts every leaf of the legal move tree to a fixed depth. The counts for the positions
+# below are known, so any difference means the move generator is wrong, and the time it takes measures its speed.
+# https://www.chessprogramming.org/Perft_Results
+# The engine always promotes to a queen, so only depths where no pawn can promote are used as references.
+#
+# usage: python -m Chess.perft [--backend board|bitboard] [--max-nodes N]
+#        python -m Chess.perft --fen "<fen>" --depth 3 [--divide]
+#        python -m Chess.perft --cross-check
+
+# (name, fen, {depth: leaf nodes})
+REFERENCE_POSITIONS = [
+    ('start position', START_FEN,
+     {1: 20, 2: 400, 3: 8902, 4: 197281, 5: 4865609}),
+    ('kiwipete', 'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1',
+     {1: 48, 2: 2039, 3: 97862}),
+    ('en passant and pins', '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1',
+     {1: 14, 2: 191, 3: 2812, 4: 43238, 5: 674624}),
+    ('castling rights', 'r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10',
+     {1: 46, 2: 2079, 3: 89890}),
+    ('castling both sides', 'r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1',
+     {1: 26, 2: 568, 3: 13744, 4: 314346}),
+    ('castling through attacked squares', 'r3k2r/8/3Q4/8/8/5q2/8/R3K2R b KQkq - 0 1',
+     {4: 1720476}),
+    ('castling gives check', '5k2/8/8/8/8/8/8/4K2R w K - 0 1',
+     {6: 661072}),
+    ('queen side castling gives check', '3k4/8/8/8/8/8/8/R3K3 w Q - 0 1',
+     {6: 803711}),
+    ('self stalemate and checkmate', '8/8/2k5/5q2/5n2/8/5K2/8 b - - 0 1',
+     {4: 23527}),
+]
+
+# depth the backend cross-check walks the move tree of every reference position to, and extra positions it walks
+CROSS_CHECK_DEPTH = 3
+CROSS_CHECK_POSITIONS = [
+    # a queen check along a line the bitboards only open once the move is mirrored on them
+    ('queen check from the side', 'rnbqkbr1/pp1ppppp/2p2n2/8/3PN3/6P1/PPP1PP1P/R1BQKBNR b KQq - 0 1', 3),
+]
+
+
+def perft(engine, depth):
+    """
+    Returns the number of leaf nodes of the legal move tree of the engine's position to the given depth
+    """
+    # bypass the valid_moves cache, this is measuring the move generator
+    moves = engine.legal_moves()[0]
+
+    # bulk count the last ply instead of making every move just to count it
+    if depth <= 1:
+        return len(moves) if depth == 1 else 1
+
+    nodes = 0
+    for move in moves:
+        engine.push(move)
+        nodes += perft(engine, depth - 1)
+        engine.pop()
+    return nodes
+
+
+def divide(engine, depth):
+    """
+    Returns a dictionary of {move in chess notation: perft of the position after it}, for finding which move a wrong
+    perft count comes from
+    """
+    counts = {}
+    for move in engine.legal_moves()[0]:
+        engine.push(move)
+        counts[move.get_chess_notation()] = perft(engine, depth - 1)
+        engine.pop()
+    return counts
+
+
+def run_reference(backend='board', max_nodes=1000000, out=sys.stdout):
+    """
+    Runs perft on every reference position for each depth with at most max_nodes leaves and prints the node count,
+    whether it matches the known value, and the nodes/sec. Returns True if every count matched.
+    """
+    all_passed = True
+    total_nodes = 0
+    total_time = 0
+
+    for name, fen, expected_counts in REFERENCE_POSITIONS:
+        for depth, expected in sorted(expected_counts.items()):
+            if expected > max_nodes:
+                continue
+            engine = new_engine(backend)
+            engine.load_fen(fen)
+
+            start = time.perf_counter()
+            nodes = perft(engine, depth)
+            elapsed = time.perf_counter() - start
+
+            passed = nodes == expected
+            all_passed = all_passed and passed
+            total_nodes += nodes
+            total_time += elapsed
+            print('{:<34} depth {}  {:>9} nodes  expected {:>9}  {:<4}  {:>6.2f}s  {:>8.0f} nodes/sec'.format(
+                name, depth, nodes, expected, 'ok' if passed else 'FAIL', elapsed, nodes / max(elapsed, 1e-9)),
+                file=out)
+
+    print('total {} nodes in {:.2f}s, {:.0f} nodes/sec'.format(total_nodes, total_time,
+                                                               total_nodes / max(total_time, 1e-9)), file=out)
+    return all_passed
+
+
+def cross_check_backends(fen, depth):
+    """
+    Walks the move tree of the position to the depth on both backends at once. Returns a list of the differences
+    found: positions where the backends generate different moves, and moves where gives_check of either backend
+    disagrees with making the move and looking whether the other king is in check.
+    """
+    board_engine = new_engine('board')
+    bitboard_engine = new_engine('bitboard')
+    board_engine.load_fen(fen)
+    bitboard_engine.load_fen(fen)
+    differences = []
+
+    def walk(depth):
+        position = board_engine.get_fen()
+        board_moves = {move.move_id: move for move in board_engine.legal_moves()[0]}
+        bitboard_moves = {move.move_id: move for move in bitboard_engine.legal_moves()[0]}
+        if board_moves.keys() != bitboard_moves.keys():
+            differences.append('{}: the backends generate different moves'.format(position))
+            return
+
+        for move_id, move in board_moves.items():
+            bitboard_move = bitboard_moves[move_id]
+            checks = (board_engine.gives_check(move), bitboard_engine.gives_check(bitboard_move))
+
+            board_engine.push(move)
+            bitboard_engine.push(bitboard_move)
+            in_check = board_engine.is_in_check(WHITE if board_engine.white_turn else BLACK)
+            if checks != (in_check, in_check):
+                differences.append('{} {}: gives_check board {} bitboard {}, in check {}'.format(
+                    position, move.get_chess_notation(), checks[0], checks[1], in_check))
+            if depth > 1:
+                walk(depth - 1)
+            bitboard_engine.pop()
+            board_engine.pop()
+
+    walk(depth)
+    return differences
+
+
+def run_cross_check(out=sys.stdout):
+    """
+    Runs the backend cross-check on the reference positions (to CROSS_CHECK_DEPTH) and the CROSS_CHECK_POSITIONS and
+    prints each result. Returns True if the backends agreed everywhere.
+    """
+    positions = [(name, fen, CROSS_CHECK_DEPTH) for name, fen, _counts in REFERENCE_POSITIONS] + CROSS_CHECK_POSITIONS
+    checks = [('{} depth {}'.format(name, depth), lambda fen=fen, depth=depth: cross_check_backends(fen, depth))
+              for name, fen, depth in positions]
+    return run_checks(checks, out)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Perft correctness and speed test for the chess engine')
+    parser.add_argument('--backend', choices=('board', 'bitboard'), default='board')
+    parser.add_argument('--fen', help='run a single position instead of the reference positions')
+    parser.add_argument('--depth', type=int, default=3, help='depth for --fen')
+    parser.add_argument('--divide', action='store_true', help='print the count after each root move for --fen')
+    parser.add_argument('--max-nodes', type=int, default=1000000,
+                        help='skip reference depths with more leaf nodes than this')
+    parser.add_argument('--cross-check', action='store_true',
+                        help='compare the moves and gives_check of the two backends instead of running perft')
+    args = parser.parse_args(argv)
+
+    if args.cross_check:
+        return 0 if run_cross_check() else 1
+    if args.fen is None:
+        return 0 if run_reference(args.backend, args.max_nodes) else 1
+
+    engine = new_engine(args.backend)
+    engine.load_fen(args.fen)
+    start = time.perf_counter()
+    if args.divide:
+        counts = divide(engine, args.depth)
+        for notation in sorted(counts):
+            print(notation, counts[notation])
+        nodes = sum(counts.values())
+    else:
+        nodes = perft(engine, args.depth)
+    elapsed = time.perf_counter() - start
+    print('{} nodes in {:.2f}s, {:.0f} nodes/sec'.format(nodes, elapsed, nodes / max(elapsed, 1e-9)))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
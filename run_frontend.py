@@ -2,4 +2,6 @@
 import sys
 from FrontEnd.frontend import main as run_game
 
-run_game()
+# the AI's worker processes are spawned and import this module again, only the real launch starts the game
+if __name__ == '__main__':
+    run_game()
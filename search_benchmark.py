@@ -0,0 +1,96 @@
+import argparse
+import sys
+
+from Chess.ai import ChessAI
+from Chess.chess_engine import ChessEngine
+from Chess.opening_book import parse_move
+
+# Benchmark of the selective search options of ChessAI on a fixed set of tactical positions
+# Every option setting searches each position to the same depth (or for the same time) and the total nodes are
+# compared with how many of the positions it still finds the right move in, since pruning that cuts the tree but
+# misses the tactics isn't worth it.
+# The positions are the first ones of the Win At Chess test suite
+# https://www.chessprogramming.org/Win_at_Chess
+#
+# usage: python -m Chess.search_benchmark [--depth 4] [--time 2.0] [--configs all,none,null_move]
+
+# (name, FEN, best moves in SAN)
+POSITIONS = (
+    ('WAC.001', '2rr3k/pp3pp1/1nnqbN1p/3pN3/2pP4/2P3Q1/PPB4P/R4RK1 w - - 0 1', ('Qg6',)),
+    ('WAC.002', '8/7p/5k2/5p2/p1p2P2/Pr1pPK2/1P1R3P/8 b - - 0 1', ('Rxb2',)),
+    ('WAC.003', '5rk1/1ppb3p/p1pb4/6q1/3P1p1r/2P1R2P/PP1BQ1P1/5RKN w - - 0 1', ('Rg3',)),
+    ('WAC.004', 'r1bq2rk/pp3pbp/2p1p1pQ/7P/3P4/2PB1N2/PP3PPR/2KR4 w - - 0 1', ('Qxh7+',)),
+    ('WAC.005', '5k2/6pp/p1qN4/1p1p4/3P4/2PKP2Q/PP3r2/3R4 b - - 0 1', ('Qc4+',)),
+    ('WAC.006', '7k/p7/1R5K/6r1/6p1/6P1/8/8 w - - 0 1', ('Rb7',)),
+    ('WAC.007', 'rnbqkb1r/pppp1ppp/8/4P3/6n1/7P/PPPNPPP1/R1BQKBNR b KQkq - 0 1', ('Ne3',)),
+    ('WAC.008', 'r4q1k/p2bR1rp/2p2Q1N/5p2/5p2/2P5/PP3PPP/R5K1 w - - 0 1', ('Rf7',)),
+    ('WAC.009', '3q1rk1/p4pp1/2pb3p/3p4/6Pr/1PNQ4/P1PB1PP1/4RRK1 b - - 0 1', ('Bh2+',)),
+    ('WAC.010', '2br2k1/2q3rn/p2NppQ1/2p1P3/Pp5R/4P3/1P3PPP/3R2K1 w - - 0 1', ('Rxh7',)),
+    ('WAC.011', 'r1b1k2r/ppppnppp/2n2q2/2b5/3NP3/2P1B3/PP3PPP/RN1QKB1R w KQkq - 0 1', ('Nxc6',)),
+    ('WAC.013', '4k1r1/2p3r1/1pR1p3/3pP2p/3P2qP/P4N2/1PQ4P/5R1K b - - 0 1', ('Qxf3+',)),
+    ('WAC.014', '5rk1/pp4p1/2n1p2p/2Npq3/2p5/6P1/P3P1BP/R4Q1K w - - 0 1', ('Qxf8+',)),
+    ('WAC.015', 'r2rb1k1/pp1q1p1p/2n1p1p1/2bp4/5P2/PP1BPR1Q/1BPN2PP/R5K1 w - - 0 1', ('Qxh7+',)),
+)
+
+# the option settings compared, each turns on the named ChessAI selective search options and leaves the rest off
+SELECTIVE_OPTIONS = ('null_move', 'late_move_reductions', 'futility_pruning')
+CONFIGS = {
+    'none': (),
+    'null_move': ('null_move',),
+    'late_move_reductions': ('late_move_reductions',),
+    'futility_pruning': ('futility_pruning',),
+    'all': SELECTIVE_OPTIONS,
+}
+
+
+def run_config(options, depth, time_limit=None):
+    """
+    Searches every position with a fresh ChessAI with the options turned on. Returns (nodes, solved, seconds, depth
+    reached) added up over the positions.
+    """
+    nodes = 0
+    solved = 0
+    seconds = 0.0
+    depths = 0
+    for _name, fen, best_moves in POSITIONS:
+        engine = ChessEngine()
+        engine.load_fen(fen)
+        expected = {parse_move(engine, best_move).move_id for best_move in best_moves}
+
+        ai = ChessAI(time_limit=time_limit, depth=depth, book_path=None, table_directory=None,
+                     **{option: option in options for option in SELECTIVE_OPTIONS})
+        move, stats = ai.negamax_alphabeta_ai(engine.valid_moves(), engine, return_stats=True)
+
+        nodes += stats.nodes + stats.qnodes
+        solved += move.move_id in expected
+        seconds += stats.elapsed
+        depths += stats.depth
+    return nodes, solved, seconds, depths
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compares the selective search options on a fixed set of positions')
+    parser.add_argument('--depth', type=int, default=4, help='depth searched in every position')
+    parser.add_argument('--time', type=float, help='search each position for this many seconds instead of to a depth')
+    parser.add_argument('--configs', default=','.join(CONFIGS), help='comma separated option settings to run')
+    args = parser.parse_args(argv)
+
+    print('{} positions, {}'.format(len(POSITIONS),
+                                   '{}s each'.format(args.time) if args.time else 'depth {}'.format(args.depth)))
+    print('{:<22} {:>10} {:>9} {:>8} {:>10} {:>10}'.format('config', 'nodes', 'vs first', 'solved', 'avg depth',
+                                                           'seconds'))
+
+    # node counts are compared with the first config run, 'none' by default
+    baseline = None
+    for config in args.configs.split(','):
+        nodes, solved, seconds, depths = run_config(CONFIGS[config], args.depth, args.time)
+        if baseline is None:
+            baseline = nodes
+        print('{:<22} {:>10} {:>8.0%} {:>5}/{:<2} {:>10.1f} {:>10.2f}'.format(
+            config, nodes, nodes / baseline if baseline else 0, solved, len(POSITIONS), depths / len(POSITIONS),
+            seconds))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,134 @@
+import json
+import time
+
+# Statistics of one search of the AI, for finding out why a search was slow
+# https://www.chessprogramming.org/Search_Statistics
+# https://www.chessprogramming.org/Branching_Factor
+
+# the counters added up while searching the tree, the ones a worker process of the parallel search sends back
+TREE_COUNTERS = ('leaves', 'beta_cutoffs', 'first_move_cutoffs', 'table_hits', 'null_move_cutoffs', 'reductions',
+                 're_searches', 'futility_prunes', 'tt_probes', 'tt_hits', 'move_cache_lookups', 'move_cache_hits')
+
+
+class SearchStats:
+    """
+    Counters and timings of a single negamax_alphabeta_ai search. The AI only creates one when asked to, so a search
+    without statistics doesn't pay for the counting.
+    """
+
+    def __init__(self):
+        self.start_time = time.perf_counter()
+        self.elapsed = 0.0
+
+        self.nodes = 0  # positions searched to a depth
+        self.qnodes = 0  # positions searched by the quiescence search
+        self.leaves = 0  # positions where the depth ran out and the quiescence search took over
+        self.beta_cutoffs = 0
+        self.first_move_cutoffs = 0  # cutoffs caused by the first move searched, the better the move ordering the more
+        self.table_hits = 0  # positions scored by the endgame tables
+
+        # selective search, counted only when the option is turned on
+        self.null_move_cutoffs = 0
+        self.reductions = 0  # late moves searched a ply shallower
+        self.re_searches = 0  # reduced moves that beat alpha and had to be searched again to the full depth
+        self.futility_prunes = 0  # quiet moves skipped near the leaves
+
+        # transposition table and valid_moves cache lookups
+        self.tt_probes = 0
+        self.tt_hits = 0
+        self.move_cache_lookups = 0
+        self.move_cache_hits = 0
+
+        # (depth, seconds, nodes + qnodes) for each finished iteration of the iterative deepening
+        self.iterations = []
+
+        # deepest finished iteration and its score, from white's point of view
+        self.depth = 0
+        self.score = None
+        self.best_move = None
+        self.source = 'search'  # or 'book' or 'tables' when the move wasn't searched
+
+    def finish_iteration(self, depth, total_nodes):
+        """
+        Records the time and the node count (so far, of the whole search) when an iteration finishes
+        """
+        self.iterations.append((depth, time.perf_counter() - self.start_time, total_nodes))
+
+    def tree_counters(self):
+        """
+        Returns the TREE_COUNTERS as a dictionary, small enough to send back from a worker process
+        """
+        return {name: getattr(self, name) for name in TREE_COUNTERS}
+
+    def add_counters(self, counters):
+        """
+        Adds the tree_counters of another search (a worker's part of a parallel search) to these
+        """
+        for name, value in counters.items():
+            setattr(self, name, getattr(self, name) + value)
+
+    def finish(self, best_move):
+        self.elapsed = time.perf_counter() - self.start_time
+        self.best_move = best_move
+
+    def first_move_cutoff_rate(self):
+        """
+        Returns the fraction of beta cutoffs that came from the first move searched
+        """
+        return self.first_move_cutoffs / self.beta_cutoffs if self.beta_cutoffs else 0.0
+
+    def effective_branching_factor(self):
+        """
+        Returns how many times more nodes the last iteration took than the one before it
+        """
+        if len(self.iterations) < 2:
+            return 0.0
+        last_nodes = self.iterations[-1][2] - self.iterations[-2][2]
+        previous_nodes = self.iterations[-2][2] - (self.iterations[-3][2] if len(self.iterations) > 2 else 0)
+        return last_nodes / previous_nodes if previous_nodes else 0.0
+
+    def nodes_per_second(self):
+        return (self.nodes + self.qnodes) / self.elapsed if self.elapsed > 0 else 0.0
+
+    def tt_hit_rate(self):
+        return self.tt_hits / self.tt_probes if self.tt_probes else 0.0
+
+    def move_cache_hit_rate(self):
+        return self.move_cache_hits / self.move_cache_lookups if self.move_cache_lookups else 0.0
+
+    def to_dict(self):
+        # time of each depth on its own rather than since the start
+        depth_times = []
+        previous = 0.0
+        for depth, seconds, _nodes in self.iterations:
+            depth_times.append([depth, round(seconds - previous, 4)])
+            previous = seconds
+
+        return {
+            'move': self.best_move.get_chess_notation() if self.best_move is not None else None,
+            'source': self.source,
+            'score': round(self.score, 2) if self.score is not None else None,
+            'depth': self.depth,
+            'time': round(self.elapsed, 4),
+            'nodes': self.nodes,
+            'qnodes': self.qnodes,
+            'leaves': self.leaves,
+            'nps': round(self.nodes_per_second()),
+            'beta_cutoffs': self.beta_cutoffs,
+            'first_move_cutoff_rate': round(self.first_move_cutoff_rate(), 4),
+            'ebf': round(self.effective_branching_factor(), 2),
+            'tt_hit_rate': round(self.tt_hit_rate(), 4),
+            'move_cache_hit_rate': round(self.move_cache_hit_rate(), 4),
+            'table_hits': self.table_hits,
+            'null_move_cutoffs': self.null_move_cutoffs,
+            'reductions': self.reductions,
+            're_searches': self.re_searches,
+            'futility_prunes': self.futility_prunes,
+            'depth_times': depth_times,
+        }
+
+    def to_json(self):
+        """
+        Returns the statistics as a single line of JSON, for logging one line per move
+        """
+        return json.dumps(self.to_dict(), separators=(',', ':'))
@@ -0,0 +1,321 @@
+import argparse
+import math
+import multiprocessing
+import os
+import random
+import sys
+import time
+
+from Chess.ai import ChessAI
+from Chess.chess_engine import ChessEngine, run_checks
+from Chess.opening_book import BOOK_SOURCE_PATH, parse_move, read_games, notation_square
+
+# Headless tournament between two AI configurations, for checking whether a change to the AI made it faster or
+# weaker without playing it by hand. The games are played in parallel in a process pool. Each opening is played twice
+# with the colours swapped so neither side gets the better openings, and every game is written to a compact archive.
+# https://www.chessprogramming.org/Match_Statistics
+# https://www.chessprogramming.org/Elo_Rating_System
+#
+# usage: python -m Chess.tournament negamax:time=0.5 greedy [--games 40] [--time 0.5] [--workers 4]
+#        [--archive games.txt] [--openings games.pgn] [--plies 8] [--seed 1]
+#        python -m Chess.tournament --check   (checks elo_difference against results worked out by hand)
+#
+# a player is random, greedy or negamax, negamax takes options after a colon e.g.
+# negamax:time=1,null_move=0,depth=4 (time, nodes, depth, null_move, late_move_reductions, futility_pruning,
+# batch_eval, book, tables)
+
+# moves of each opening game played before the AIs take over
+OPENING_PLIES = 8
+
+# a game that gets this long is called a draw
+MAX_GAME_PLIES = 300
+
+# ChessAI keyword arguments a negamax player can set, and how to read their values
+NEGAMAX_OPTIONS = {
+    'time': ('time_limit', float),
+    'nodes': ('node_limit', int),
+    'depth': ('depth', int),
+    'null_move': ('null_move', lambda value: value != '0'),
+    'late_move_reductions': ('late_move_reductions', lambda value: value != '0'),
+    'futility_pruning': ('futility_pruning', lambda value: value != '0'),
+    'batch_eval': ('batch_eval', lambda value: value != '0'),
+    'book': ('book_path', lambda value: None if value == '0' else value),
+    'tables': ('table_directory', lambda value: None if value == '0' else value),
+}
+
+# for checking elo_difference, ((wins, draws, losses), (Elo difference, 95% error margin)). 75% is 400 * log10(3) Elo,
+# the margins are worked out from the standard error of the score by hand
+ELO_RESULTS = [
+    ((0, 0, 0), (0.0, 0.0)),
+    ((10, 0, 10), (0.0, 163.32)),
+    ((0, 20, 0), (0.0, 0.0)),
+    ((15, 0, 5), (190.85, 217.63)),
+    ((5, 0, 15), (-190.85, 217.63)),
+    ((30, 10, 10), (147.19, 95.14)),
+    ((7, 0, 0), (math.inf, math.inf)),
+    ((0, 0, 7), (-math.inf, math.inf)),
+]
+ELO_TOLERANCE = 0.01
+
+# results, from white's point of view
+WHITE_WINS = '1-0'
+BLACK_WINS = '0-1'
+DRAW = '1/2-1/2'
+
+
+def parse_player(spec, time_limit=None):
+    """
+    Returns (kind, ChessAI keyword arguments) of a player spec like 'greedy' or 'negamax:time=0.5,null_move=0'. A
+    negamax player without a time, node or depth limit gets time_limit. The opening book is off unless asked for,
+    the tournament's openings are what keeps the games apart.
+    """
+    kind, _, options = spec.partition(':')
+    if kind not in ('random', 'greedy', 'negamax'):
+        raise ValueError('Unknown player: ' + spec)
+
+    kwargs = {'book_path': None}
+    for option in filter(None, options.split(',')):
+        name, _, value = option.partition('=')
+        if kind != 'negamax' or name not in NEGAMAX_OPTIONS:
+            raise ValueError('Unknown option {} for {}'.format(name, kind))
+        keyword, convert = NEGAMAX_OPTIONS[name]
+        kwargs[keyword] = convert(value)
+
+    if kind == 'negamax' and not any(keyword in kwargs for keyword in ('time_limit', 'node_limit', 'depth')):
+        kwargs['time_limit'] = time_limit
+    return kind, kwargs
+
+
+def load_openings(path=BOOK_SOURCE_PATH, plies=OPENING_PLIES):
+    """
+    Returns the distinct first plies moves of the games in a PGN or move list file, as lists of moves in coordinate
+    notation. Just the starting position if there is no file.
+    """
+    if path is None or not os.path.exists(path):
+        return [[]]
+    with open(path) as openings_file:
+        games = read_games(openings_file.read())
+
+    openings = []
+    for game in games:
+        engine = ChessEngine()
+        opening = []
+        for text in game[:plies]:
+            move = parse_move(engine, text)
+            opening.append(coordinate_notation(move))
+            engine.make_move(move)
+        if opening not in openings:
+            openings.append(opening)
+    return openings or [[]]
+
+
+def coordinate_notation(move):
+    """
+    Returns a move as e.g. 'e2e4', which parse_move reads back
+    """
+    return notation_square(move.start_row, move.start_col) + notation_square(move.end_row, move.end_col)
+
+
+def choose_move(kind, ai, engine, moves):
+    """
+    Returns (move, nodes searched) for the player
+    """
+    if kind == 'random':
+        return ai.random_ai(moves), 0
+    if kind == 'greedy':
+        return ai.greedy_ai(moves, engine), 0
+    move, stats = ai.negamax_alphabeta_ai(moves, engine, return_stats=True)
+    return move, stats.nodes + stats.qnodes
+
+
+def play_game(task):
+    """
+    Plays one game in a worker process. The task is (game number, opening moves, white spec, black spec, time limit,
+    seed). Returns a dictionary of the result, how the game ended, the moves and each side's time and nodes.
+    """
+    number, opening, white_spec, black_spec, time_limit, seed = task
+    random.seed(seed)
+
+    players = {}
+    for color, spec in (('w', white_spec), ('b', black_spec)):
+        kind, kwargs = parse_player(spec, time_limit)
+        players[color] = (kind, ChessAI(**kwargs))
+    totals = {color: {'moves': 0, 'seconds': 0.0, 'nodes': 0} for color in players}
+
+    engine = ChessEngine()
+    moves_played = []
+    for text in opening:
+        move = parse_move(engine, text)
+        engine.make_move(move)
+        moves_played.append(text)
+
+    result = DRAW
+    termination = 'max plies'
+    while len(moves_played) < MAX_GAME_PLIES:
+        moves = engine.valid_moves()
+        if engine.checkmate:
+            result = BLACK_WINS if engine.white_turn else WHITE_WINS
+            termination = 'checkmate'
+            break
+        if engine.stalemate:
+            termination = 'stalemate' if not moves else 'draw'
+            break
+
+        color = 'w' if engine.white_turn else 'b'
+        kind, ai = players[color]
+        start = time.perf_counter()
+        move, nodes = choose_move(kind, ai, engine, moves)
+        totals[color]['seconds'] += time.perf_counter() - start
+        totals[color]['nodes'] += nodes
+        totals[color]['moves'] += 1
+
+        engine.make_move(move)
+        moves_played.append(coordinate_notation(move))
+
+    for _kind, ai in players.values():
+        ai.close()
+    return {'number': number, 'white': white_spec, 'black': black_spec, 'result': result, 'termination': termination,
+            'moves': moves_played, 'totals': totals}
+
+
+def elo_difference(wins, draws, losses):
+    """
+    Returns (Elo difference, 95% error margin) for the score of wins, draws and losses. The difference is infinite
+    when every game was won or lost.
+    """
+    games = wins + draws + losses
+    if games == 0:
+        return 0.0, 0.0
+    score = (wins + draws / 2) / games
+    if score in (0, 1):
+        return math.copysign(math.inf, score - 0.5), math.inf
+
+    # standard error of the mean score per game, 1.96 of them either side for 95%
+    variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+    margin = 1.96 * math.sqrt(variance / games)
+    low = elo_from_score(max(score - margin, 1e-9))
+    high = elo_from_score(min(score + margin, 1 - 1e-9))
+    return elo_from_score(score), (high - low) / 2
+
+
+def elo_from_score(score):
+    return -400 * math.log10(1 / score - 1)
+
+
+def check_elo_difference():
+    """
+    Returns the problems found comparing elo_difference with the ELO_RESULTS worked out by hand
+    """
+    problems = []
+    for score, expected in ELO_RESULTS:
+        result = elo_difference(*score)
+        if any(not math.isclose(value, expected_value, abs_tol=ELO_TOLERANCE)
+               for value, expected_value in zip(result, expected)):
+            problems.append('W/D/L {}: {}, expected {}'.format(score, result, expected))
+    return problems
+
+
+def write_archive(games, path):
+    """
+    Writes the games one per line, with a comment line of who played, the result and how it ended above each.
+    It is a move list file like opening_book.txt, so read_games (and the opening book builder) can read it back.
+    """
+    with open(path, 'w') as archive:
+        for game in sorted(games, key=lambda game: game['number']):
+            archive.write('# {} {} vs {} {} ({})\n'.format(game['number'], game['white'], game['black'],
+                                                           game['result'], game['termination']))
+            archive.write(' '.join(game['moves'] + [game['result']]) + '\n')
+
+
+def run_tournament(player_a, player_b, games, time_limit, workers, openings, seed=None):
+    """
+    Plays the games between the two player specs in a pool of workers processes. Player A has white in the even
+    numbered games, each opening is played once with each colour. Returns the list of game results.
+    """
+    seed = random.randrange(1 << 30) if seed is None else seed
+    tasks = []
+    for number in range(games):
+        opening = openings[(number // 2) % len(openings)]
+        white, black = (player_a, player_b) if number % 2 == 0 else (player_b, player_a)
+        tasks.append((number, opening, white, black, time_limit, seed + number))
+
+    if workers <= 1:
+        return [play_game(task) for task in tasks]
+    with multiprocessing.Pool(workers) as pool:
+        return list(pool.imap_unordered(play_game, tasks))
+
+
+def report(results, player_a, player_b):
+    """
+    Prints the win/draw/loss count of player A, the Elo difference and each player's time per move and nodes per
+    second
+    """
+    wins = draws = losses = 0
+    # the players are told apart by position and not by spec, so a spec can play itself
+    players = {'A': {'moves': 0, 'seconds': 0.0, 'nodes': 0}, 'B': {'moves': 0, 'seconds': 0.0, 'nodes': 0}}
+    terminations = {}
+    for game in results:
+        # player A has white in the even numbered games (run_tournament)
+        a_color = 'w' if game['number'] % 2 == 0 else 'b'
+        if game['result'] == DRAW:
+            draws += 1
+        elif (game['result'] == WHITE_WINS) == (a_color == 'w'):
+            wins += 1
+        else:
+            losses += 1
+        terminations[game['termination']] = terminations.get(game['termination'], 0) + 1
+
+        for color in ('w', 'b'):
+            player = 'A' if color == a_color else 'B'
+            for key, value in game['totals'][color].items():
+                players[player][key] += value
+
+    elo, margin = elo_difference(wins, draws, losses)
+    print('A {} vs B {}: {} games'.format(player_a, player_b, len(results)))
+    print('W/D/L {}/{}/{}  score {:.1%}'.format(wins, draws, losses, (wins + draws / 2) / len(results)))
+    print('Elo difference {:+.0f} +/- {:.0f}'.format(elo, margin))
+    print('endings: ' + ', '.join('{} {}'.format(name, count) for name, count in sorted(terminations.items())))
+    for player, spec in (('A', player_a), ('B', player_b)):
+        totals = players[player]
+        moves = totals['moves'] or 1
+        nps = totals['nodes'] / totals['seconds'] if totals['seconds'] else 0
+        print('{} {:<38} {:>6} moves {:>8.3f}s/move {:>9.0f} nodes/s'.format(player, spec, totals['moves'],
+                                                                              totals['seconds'] / moves, nps))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Plays two AI configurations against each other')
+    parser.add_argument('player_a', nargs='?', help='random, greedy or negamax[:option=value,...]')
+    parser.add_argument('player_b', nargs='?', help='random, greedy or negamax[:option=value,...]')
+    parser.add_argument('--games', type=int, default=20)
+    parser.add_argument('--time', type=float, default=0.5, help='seconds per move of negamax players without a limit')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='games played at once')
+    parser.add_argument('--openings', default=BOOK_SOURCE_PATH, help='PGN or move list file the openings come from')
+    parser.add_argument('--plies', type=int, default=OPENING_PLIES, help='moves of each opening played')
+    parser.add_argument('--archive', help='file to write the games to')
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--check', action='store_true', help='check elo_difference instead of playing')
+    args = parser.parse_args(argv)
+
+    if args.check:
+        return 0 if run_checks([('tournament Elo difference', check_elo_difference)]) else 1
+    if args.player_b is None:
+        parser.error('two players are needed')
+
+    # bad player specs should fail here rather than in every worker
+    parse_player(args.player_a)
+    parse_player(args.player_b)
+
+    openings = load_openings(args.openings, args.plies)
+    start = time.perf_counter()
+    results = run_tournament(args.player_a, args.player_b, args.games, args.time, args.workers, openings, args.seed)
+    report(results, args.player_a, args.player_b)
+    print('{:.1f}s'.format(time.perf_counter() - start))
+
+    if args.archive:
+        write_archive(results, args.archive)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,94 @@
+# Transposition table for the negamax search
+# https://www.chessprogramming.org/Transposition_Table
+# The same position is often reached through different move orders. The table remembers, by zobrist key, how deep a
+# position was searched, the score it got, whether that score is exact or only a bound (because of an alpha-beta
+# cutoff) and the best move found, so the search can reuse it instead of searching the position again.
+
+# what a stored score means
+EXACT = 0
+LOWER_BOUND = 1  # the search failed high (beta cutoff), the real score is at least this
+UPPER_BOUND = 2  # no move raised alpha, the real score is at most this
+
+# default memory cap for the table in megabytes
+TT_SIZE_MB = 16
+
+# rough size of one stored entry (a tuple of six ints and its slot in the list)
+ENTRY_BYTES = 160
+
+# fields of an entry tuple
+KEY, DEPTH, SCORE, FLAG, BEST_MOVE, AGE = range(6)
+
+
+class TranspositionTable:
+    """
+    Fixed size table of search results. Each bucket has two slots: a depth-preferred slot that keeps the deepest
+    result of the current search, and an always-replace slot that takes whatever the depth-preferred slot turned
+    down. Entries remember the search (age) they were stored in, so results from earlier moves of the game can be kept
+    and reused but are replaced first.
+    """
+
+    def __init__(self, size_mb=TT_SIZE_MB):
+        # two entries per bucket
+        self.bucket_count = max(1, size_mb * 1024 * 1024 // (ENTRY_BYTES * 2))
+        self.depth_slots = [None] * self.bucket_count
+        self.always_slots = [None] * self.bucket_count
+        self.age = 0
+
+        # statistics
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+
+    def new_search(self):
+        """
+        Starts a new search, entries from older searches become the first ones to be replaced
+        """
+        self.age += 1
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+
+    def clear(self):
+        """
+        Empties the table, e.g. for a new game
+        """
+        self.depth_slots = [None] * self.bucket_count
+        self.always_slots = [None] * self.bucket_count
+        self.age = 0
+
+    def probe(self, key):
+        """
+        Returns the (key, depth, score, flag, best move id, age) entry stored for the position key or None
+        """
+        self.probes += 1
+        index = key % self.bucket_count
+
+        entry = self.depth_slots[index]
+        if entry is None or entry[KEY] != key:
+            entry = self.always_slots[index]
+            if entry is None or entry[KEY] != key:
+                return None
+
+        self.hits += 1
+        return entry
+
+    def store(self, key, depth, score, flag, best_move_id):
+        """
+        Stores a search result for the position key. best_move_id is the move_id of the best move found, or None.
+        """
+        self.stores += 1
+        index = key % self.bucket_count
+        entry = (key, depth, score, flag, best_move_id, self.age)
+
+        # the depth-preferred slot takes the entry unless it holds a deeper result of this same search
+        current = self.depth_slots[index]
+        if current is None or current[KEY] == key or current[AGE] != self.age or depth >= current[DEPTH]:
+            self.depth_slots[index] = entry
+        else:
+            self.always_slots[index] = entry
+
+    def hit_rate(self):
+        """
+        Returns the fraction of probes of the current search that found an entry
+        """
+        return self.hits / self.probes if self.probes else 0.0
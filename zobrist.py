@@ -0,0 +1,27 @@
+import random
+
+# Zobrist hashing keys for the chess engine
+# https://www.chessprogramming.org/Zobrist_Hashing
+# Every (piece, square) pair, the side to move, each combination of castling rights and each en passant file gets a
+# random 64-bit number. The key of a position is the XOR of the numbers of everything that is on it, so a move only
+# needs to XOR out what changed instead of rehashing the board.
+
+# use a fixed seed so the same position always gets the same key (between games, runs and processes)
+_rng = random.Random(0x5EED_C4E55)
+
+# PIECE_KEYS['wP'][row][col]
+PIECE_KEYS = {}
+for _color in ('w', 'b'):
+    for _piece in ('P', 'N', 'B', 'R', 'Q', 'K'):
+        PIECE_KEYS[_color + _piece] = [[_rng.getrandbits(64) for _col in range(8)] for _row in range(8)]
+
+# XORed in when it is black's turn
+BLACK_TO_MOVE_KEY = _rng.getrandbits(64)
+
+# indexed by the castling rights bits of ChessEngine (white king side, black king side, white queen side, black queen
+# side)
+CASTLING_KEYS = [_rng.getrandbits(64) for _index in range(16)]
+
+# indexed by the column of the en passant square
+ENPASSANT_KEYS = [_rng.getrandbits(64) for _col in range(8)]
+